@@ -1,24 +1,75 @@
-import os
-from pydantic_settings import BaseSettings, SettingsConfigDict
-from dotenv import load_dotenv
+from functools import lru_cache
+from typing import Optional
 
-# Cargar variables de entorno del archivo .env
-load_dotenv()
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
     """
     Configuración de la aplicación cargada desde variables de entorno.
+    Pydantic-Settings lee cada campo por su nombre desde el entorno o el archivo .env.
     """
-    model_config = SettingsConfigDict(case_sensitive=True)
+    model_config = SettingsConfigDict(env_file=".env", case_sensitive=True, extra="ignore")
 
     # Configuración de la base de datos MongoDB
-    MONGODB_URL: str = os.getenv("MONGODB_URL", "mongodb://localhost:27017/park-net")
-    MONGODB_DB_NAME: str = os.getenv("MONGODB_DB_NAME", "park-net")
+    MONGODB_URL: str = "mongodb://localhost:27017/park-net"
+    MONGODB_DB_NAME: str = "park-net"
+    MONGODB_MAX_POOL_SIZE: int = 100
+    MONGODB_MIN_POOL_SIZE: int = 10
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = 3000
+    # Transacciones multi-documento (solicitud + slot del usuario); requieren un replica set o clúster
+    MONGODB_TRANSACTIONS: bool = False
 
     # Clave secreta para JWT (JSON Web Tokens)
-    SECRET_KEY: str = os.getenv("SECRET_KEY", "ES_UN_SECRETO")
+    SECRET_KEY: str = "ES_UN_SECRETO"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440  # Tiempo de expiración del token de acceso
 
+    # Orígenes permitidos por CORS (lista separada por comas) y expresión regular opcional
+    # para orígenes dinámicos. No se admite "*" porque la API usa credenciales.
+    ALLOWED_ORIGINS: str = "http://localhost,http://localhost:8080"
+    ALLOWED_ORIGIN_REGEX: str = r"^https?://localhost(:\d+)?$"
+
+    # TTL (segundos) de la caché de usuarios por ID/CC del servicio de residentes; 0 la desactiva
+    USER_CACHE_TTL: int = 30
+
+    # TTL (segundos) de la caché de páginas del listado de solicitudes; 0 la desactiva
+    REQUEST_LIST_CACHE_TTL: int = 15
+
+    # TTL (segundos) de la caché de resultados de sorteo por período; 0 la desactiva
+    LOTTERY_RESULT_CACHE_TTL: int = 30
+
+    # Segundos tras los cuales una ejecución de sorteo en segundo plano que sigue en 'running'
+    # se considera interrumpida (ej. reinicio del worker) y se marca como fallida
+    LOTTERY_JOB_TIMEOUT: int = 900
+
+    # Parámetros de Argon2id para el hashing de contraseñas (memoria en KiB)
+    ARGON2_TIME_COST: int = 2
+    ARGON2_MEMORY_COST: int = 19456
+    ARGON2_PARALLELISM: int = 1
+
+    # Clave de la API de Resend para el envío de correos
+    RESEND_KEY: Optional[str] = None
+    # Máximo de envíos simultáneos a Resend (límite de peticiones de la API)
+    RESEND_MAX_CONCURRENCY: int = 10
+
+    # Perfilado de peticiones con pyinstrument (requiere instalarlo aparte): con PROFILING activo,
+    # las peticiones con ?profile=1 generan un archivo speedscope en PROFILING_DIR
+    PROFILING: bool = False
+    PROFILING_DIR: str = "/tmp/profiles"
+
+    # Diagnósticos de los scripts de app/test (se leen aquí para que también los tome el .env):
+    # DEBUG_SECURITY imprime la prueba de hashing al crear el admin; RUN_REPO_TESTS ejecuta
+    # las pruebas del repositorio al iniciar main-repository.py
+    DEBUG_SECURITY: bool = False
+    RUN_REPO_TESTS: bool = False
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Devuelve la configuración de la aplicación, validada una sola vez por proceso.
+    """
+    return Settings()
+
+
 # Instancia de configuración para ser usada en la aplicación
-settings = Settings()
\ No newline at end of file
+settings = get_settings()
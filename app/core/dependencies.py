@@ -1,20 +1,43 @@
+from threading import Lock
 from typing import AsyncGenerator, Generator, Annotated
 
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from motor.motor_asyncio import AsyncIOMotorDatabase
-from jose import JWTError
+from pymongo.asynchronous.database import AsyncDatabase
 
 from app.database.mongodb import get_database
-from app.core.security import decode_access_token
+from app.core.security import decode_access_token, is_token_expired
+from app.modules.auth.schemas import TokenData
 from app.modules.residentes.models import User # Necesitamos el modelo User para tipado
-from app.shared.repository import BaseRepository
+from app.shared.repository import get_repository
 
 # Esquema de seguridad OAuth2 con password flow para el token.
 # Indica a FastAPI que espere un token en el header "Authorization: Bearer <token>"
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token") # 'tokenUrl' es la URL donde se obtiene el token
 
-async def get_db() -> AsyncGenerator[AsyncIOMotorDatabase, None]:
+# Proyección usada al cargar el usuario autenticado: el hash de la contraseña nunca
+# se necesita después del login, así que no se transfiere ni se guarda en caché.
+# 'vehicle_slots' se mantiene porque /auth/me lo devuelve en ResidentOut.
+CURRENT_USER_PROJECTION = {"hashed_password": 0}
+
+# Caché corta token -> (User, TokenData) para no consultar MongoDB en cada petición autenticada.
+# Se invalida explícitamente cuando cambian los datos del usuario (ver invalidate_user_cache)
+# y cada acierto revisa el 'exp' del token guardado junto al usuario.
+_user_cache: TTLCache = TTLCache(maxsize=2048, ttl=15)
+_user_cache_lock = Lock()
+
+def invalidate_user_cache(user_id: str) -> None:
+    """
+    Elimina de la caché de autenticación todas las entradas del usuario indicado.
+    Debe llamarse después de modificar el rol, estado o datos de un usuario.
+    """
+    with _user_cache_lock:
+        stale_tokens = [token for token, (user, _) in _user_cache.items() if str(user.id) == str(user_id)]
+        for token in stale_tokens:
+            _user_cache.pop(token, None)
+
+async def get_db() -> AsyncGenerator[AsyncDatabase, None]:
     """
     Dependencia que proporciona una instancia de la base de datos a los endpoints.
     Asegura que la conexión se maneje correctamente.
@@ -29,36 +52,64 @@ async def get_db() -> AsyncGenerator[AsyncIOMotorDatabase, None]:
         # La conexión global se cierra en los eventos de shutdown de la app (main.py).
         pass
 
-async def get_current_user(
-    db: Annotated[AsyncIOMotorDatabase, Depends(get_db)],
-    token: Annotated[str, Depends(oauth2_scheme)]
-) -> User:
-    """
-    Dependencia para obtener el usuario autenticado a partir del token JWT.
-    Retorna el objeto User si el token es válido y el usuario está activo.
-    """
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="No se pudieron validar las credenciales",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
-    # Decodificar el token para obtener los datos del payload
-    token_data = decode_access_token(token)
-    if token_data is None:
-        raise credentials_exception
 
+async def get_token_data(
+    token: Annotated[str, Depends(oauth2_scheme)]
+) -> TokenData:
+    """
+    Dependencia que decodifica el token JWT y retorna su payload (id, rol, email).
+    FastAPI la resuelve una sola vez por petición, aunque varias dependencias la usen,
+    y permite hacer verificaciones de rol sin consultar la base de datos.
+    """
+    token_data = decode_access_token(token)
     # El ID del usuario está en el campo 'id' del payload
-    user_id = token_data.id
-    if user_id is None:
-        raise credentials_exception
+    if token_data is None or token_data.id is None:
+        raise _credentials_exception()
+    return token_data
 
-    # Recuperar el usuario de la base de datos usando el ID del token
-    user_repository = BaseRepository(db["users"], User)
-    current_user = await user_repository.get(user_id)
-    
-    if current_user is None:
-        raise credentials_exception
+async def _load_user(token_data: TokenData, token: str, db: AsyncDatabase) -> User:
+    """
+    Recupera el usuario del token desde la caché de autenticación o, si no está, desde MongoDB.
+    Lanza 401 si el usuario ya no existe o si el token guardado con él ya expiró.
+    """
+    with _user_cache_lock:
+        cached = _user_cache.get(token)
+
+    if cached is not None:
+        current_user, cached_token_data = cached
+        if is_token_expired(cached_token_data):
+            with _user_cache_lock:
+                _user_cache.pop(token, None)
+            raise _credentials_exception()
+    else:
+        # Recuperar el usuario de la base de datos usando el ID del token
+        user_repository = get_repository(db, "users", User)
+        current_user = await user_repository.get(token_data.id, projection=CURRENT_USER_PROJECTION)
+
+        if current_user is None:
+            raise _credentials_exception()
+
+        with _user_cache_lock:
+            _user_cache[token] = (current_user, token_data)
+
+    return current_user
+
+async def get_current_user(
+    token_data: Annotated[TokenData, Depends(get_token_data)],
+    token: Annotated[str, Depends(oauth2_scheme)],
+    db: Annotated[AsyncDatabase, Depends(get_db)]
+) -> User:
+    """
+    Dependencia para obtener el usuario autenticado a partir del token JWT.
+    Retorna el objeto User si el token es válido y el usuario está activo.
+    """
+    current_user = await _load_user(token_data, token, db)
     
     # Opcional: Puedes añadir una verificación de estado aquí si no lo hiciste en el servicio de autenticación
     # if current_user.status != "active":
@@ -79,15 +130,35 @@ async def get_current_active_user(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Usuario inactivo")
     return current_user
 
-async def get_current_active_admin_user(
-    current_user: Annotated[User, Depends(get_current_active_user)]
+async def require_admin(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    db: Annotated[AsyncDatabase, Depends(get_database)]
 ) -> User:
     """
-    Dependencia para obtener el usuario autenticado y activo y asegurar que sea administrador.
+    Dependencia única para las rutas de administrador: decodifica el token, verifica el rol
+    del token (sin acceder a MongoDB), carga el usuario y comprueba que esté activo y que su
+    rol almacenado siga siendo administrador (por si fue degradado después de emitir el token).
+    La base de datos se inyecta con la misma dependencia que los routers (get_database), así que
+    un solo dependency_overrides la reemplaza en ambos.
     """
+    token_data = decode_access_token(token)
+    if token_data is None or token_data.id is None:
+        raise _credentials_exception()
+
+    if token_data.role != "administrador":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tienes permisos de administrador."
+        )
+
+    current_user = await _load_user(token_data, token, db)
+
+    if current_user.status != "active":
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Usuario inactivo")
+
     if current_user.role != "administrador":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="No tienes permisos de administrador."
         )
-    return current_user
\ No newline at end of file
+    return current_user
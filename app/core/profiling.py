@@ -0,0 +1,50 @@
+"""
+Perfilado de peticiones con pyinstrument, solo para diagnóstico.
+
+Con PROFILING activo, cualquier petición con ?profile=1 se muestrea y el resultado se guarda
+en PROFILING_DIR en formato speedscope (https://www.speedscope.app). El resto de peticiones
+pasa sin muestrear, y con PROFILING desactivado el middleware ni siquiera se registra.
+"""
+import asyncio
+import logging
+import time
+from pathlib import Path
+
+from fastapi import FastAPI, Request
+
+from app.core.config import settings
+
+logger = logging.getLogger("parknet")
+
+def setup_profiling(app: FastAPI) -> None:
+    """
+    Registra el middleware de perfilado si PROFILING está activo.
+    pyinstrument es una dependencia opcional: solo se importa cuando se pide el perfilado.
+    """
+    if not settings.PROFILING:
+        return
+    try:
+        from pyinstrument import Profiler
+        from pyinstrument.renderers import SpeedscopeRenderer
+    except ImportError as exc:
+        raise RuntimeError("PROFILING está activo pero pyinstrument no está instalado (pip install pyinstrument).") from exc
+
+    output_dir = Path(settings.PROFILING_DIR)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        if request.query_params.get("profile") != "1":
+            return await call_next(request)
+        # async_mode="enabled": solo se cuenta el tiempo de esta petición, no el de otras tareas del loop
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        try:
+            return await call_next(request)
+        finally:
+            profiler.stop()
+            name = request.url.path.strip("/").replace("/", "_") or "root"
+            path = output_dir / f"{int(time.time() * 1000)}-{request.method}-{name}.speedscope.json"
+            # La escritura del archivo se hace en un hilo para no bloquear el event loop
+            await asyncio.to_thread(path.write_text, profiler.output(renderer=SpeedscopeRenderer()))
+            logger.info("Perfil de %s %s guardado en %s", request.method, request.url.path, path)
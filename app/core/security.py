@@ -1,28 +1,104 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from threading import Lock
 from typing import Optional
 from typing import cast
 
-from jose import jwt, JWTError
-from passlib.context import CryptContext
+from cachetools import TTLCache
+import jwt
+from jwt import InvalidTokenError as JWTError
 import bcrypt
+from argon2 import PasswordHasher, Type
+from argon2.exceptions import VerificationError, InvalidHashError
 
 from app.core.config import settings
 from app.modules.auth.schemas import TokenData # Importamos TokenData para la estructura del payload
 
-# Configuración para el hashing de contraseñas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Caché de tokens válidos ya decodificados (token crudo -> TokenData, con su 'exp').
+# Cada acierto vuelve a comparar 'exp' con la hora actual, así que un token expirado no se
+# acepta desde la caché. Los tokens inválidos no se guardan: una ráfaga de tokens basura
+# no desplaza de la caché a los válidos.
+JWT_CACHE_TTL_SECONDS = 30
+_jwt_cache: TTLCache = TTLCache(maxsize=4096, ttl=JWT_CACHE_TTL_SECONDS)
+_jwt_cache_lock = Lock()
+
+# Opciones fijas para jwt.decode: el token solo lleva 'exp', 'id', 'role' y 'email',
+# así que se desactivan las verificaciones de claims que nunca están presentes y se
+# exigen explícitamente los claims obligatorios.
+_JWT_DECODE_OPTIONS = {
+    "verify_signature": True,
+    "verify_aud": False,
+    "verify_iss": False,
+    "verify_sub": False,
+    "verify_jti": False,
+    "require": ["exp", "id"],
+}
+_JWT_ALGORITHMS = (settings.ALGORITHM,)
+# Longitud máxima aceptada para un token; los emitidos por la API ocupan unos pocos cientos de bytes
+_JWT_MAX_LENGTH = 4096
+
+# Pool acotado para el hashing de contraseñas: argon2 y bcrypt liberan el GIL, así que
+# los hilos aprovechan varios núcleos sin ocupar el pool por defecto del event loop.
+_hash_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="password-hash")
+
+# Argon2id con los parámetros interactivos recomendados por OWASP (t=2, m=19 MiB, p=1).
+# Se instancia una sola vez al importar el módulo.
+_password_hasher = PasswordHasher(
+    time_cost=settings.ARGON2_TIME_COST,
+    memory_cost=settings.ARGON2_MEMORY_COST,
+    parallelism=settings.ARGON2_PARALLELISM,
+    hash_len=32,
+    salt_len=16,
+    type=Type.ID
+)
+
+# Prefijos de los hashes bcrypt generados antes de migrar a Argon2id
+_BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(
-        plain_password.encode('utf-8'),
-        hashed_password.encode('utf-8')
-    )
+    """
+    Verifica una contraseña contra su hash Argon2id o, para cuentas antiguas, bcrypt.
+    """
+    if hashed_password.startswith(_BCRYPT_PREFIXES):
+        return bcrypt.checkpw(
+            plain_password.encode('utf-8'),
+            hashed_password.encode('utf-8')
+        )
+    try:
+        return _password_hasher.verify(hashed_password, plain_password)
+    except (VerificationError, InvalidHashError):
+        return False
 
 def get_password_hash(password: str) -> str:
-    return bcrypt.hashpw(
-        password.encode('utf-8'),
-        bcrypt.gensalt()
-    ).decode('utf-8')
+    return _password_hasher.hash(password)
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """
+    Indica si el hash debe regenerarse: es bcrypt o usa parámetros Argon2 distintos a los actuales.
+    """
+    if hashed_password.startswith(_BCRYPT_PREFIXES):
+        return True
+    try:
+        return _password_hasher.check_needs_rehash(hashed_password)
+    except InvalidHashError:
+        return True
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    Versión asíncrona de verify_password: ejecuta el hashing en _hash_pool para no bloquear el event loop.
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        _hash_pool, verify_password, plain_password, hashed_password
+    )
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    Versión asíncrona de get_password_hash: ejecuta el hashing en _hash_pool para no bloquear el event loop.
+    """
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, get_password_hash, password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
@@ -39,8 +115,44 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 def decode_access_token(token: str) -> Optional[TokenData]:
+    """
+    Decodifica y valida un token JWT, retornando su payload como TokenData.
+    Los tokens válidos se guardan en una caché TTL para que las peticiones repetidas con el
+    mismo token no vuelvan a verificar la firma; la expiración se revisa en cada acierto.
+    """
+    # Descartar sin excepciones (ni entradas en caché) los tokens que no tienen forma de JWT
+    if not token or len(token) > _JWT_MAX_LENGTH or token.count(".") != 2:
+        return None
+
+    with _jwt_cache_lock:
+        cached = _jwt_cache.get(token)
+    if cached is not None:
+        if is_token_expired(cached):
+            with _jwt_cache_lock:
+                _jwt_cache.pop(token, None)
+            return None
+        return cached
+
+    token_data = _decode_access_token(token)
+    if token_data is not None:
+        with _jwt_cache_lock:
+            _jwt_cache[token] = token_data
+    return token_data
+
+def is_token_expired(token_data: TokenData) -> bool:
+    """
+    Indica si el 'exp' del token ya pasó. Lo usan las cachés de autenticación en cada acierto.
+    """
+    return token_data.exp is not None and token_data.exp <= time.time()
+
+def _decode_access_token(token: str) -> Optional[TokenData]:
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = jwt.decode(
+            token,
+            settings.SECRET_KEY,
+            algorithms=_JWT_ALGORITHMS,
+            options=_JWT_DECODE_OPTIONS
+        )
         
         # Usar cast con verificación
         user_id = cast(str, payload.get("id")) if "id" in payload else None
@@ -50,6 +162,6 @@ def decode_access_token(token: str) -> Optional[TokenData]:
         if user_id is None:
             return None
             
-        return TokenData(id=user_id, role=user_role, email=user_email)
+        return TokenData(id=user_id, role=user_role, email=user_email, exp=payload["exp"])
     except JWTError:
         return None
\ No newline at end of file
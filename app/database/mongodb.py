@@ -1,44 +1,177 @@
-from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo.errors import ServerSelectionTimeoutError
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from pymongo import AsyncMongoClient, IndexModel
+from pymongo.asynchronous.client_session import AsyncClientSession
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.collation import Collation
+from pymongo.errors import OperationFailure, ServerSelectionTimeoutError
 from app.core.config import settings
 
-client: AsyncIOMotorClient = None  # type: ignore
+logger = logging.getLogger("parknet")
+
+# Collation para ordenar nombres sin distinguir mayúsculas/minúsculas; las consultas que
+# ordenan por full_name deben usar la misma para aprovechar el índice (status, full_name).
+USER_NAME_COLLATION = Collation(locale="en", strength=2)
+
+client: AsyncMongoClient = None  # type: ignore
+database: AsyncDatabase = None  # type: ignore
 
 async def connect_to_mongo():
     """
     Establece la conexión a la base de datos MongoDB.
+    Solo se crea un cliente (y su pool de conexiones) por proceso.
     """
-    global client
+    global client, database
+    if client is not None:
+        return
     try:
-        client = AsyncIOMotorClient(settings.MONGODB_URL)
+        client = AsyncMongoClient(
+            settings.MONGODB_URL,
+            maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+            minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+            serverSelectionTimeoutMS=settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+            uuidRepresentation="standard"
+        )
+        database = client[settings.MONGODB_DB_NAME]
         await client.admin.command('ping')
-        print(f"Conexión a MongoDB establecida exitosamente a {settings.MONGODB_URL}")
+        logger.info("Conexión a MongoDB establecida exitosamente a %s", settings.MONGODB_URL)
         await create_indexes()
     except ServerSelectionTimeoutError as err:
-        print(f"Error al conectar a MongoDB: {err}. Asegúrate de que MongoDB esté corriendo.")
+        logger.error("Error al conectar a MongoDB: %s. Asegúrate de que MongoDB esté corriendo.", err)
+        client = None  # type: ignore
+        database = None  # type: ignore
         raise
     except Exception as e:
-        print(f"Error inesperado al conectar a MongoDB: {e}")
+        logger.error("Error inesperado al conectar a MongoDB: %s", e)
+        client = None  # type: ignore
+        database = None  # type: ignore
         raise
 
 async def close_mongo_connection():
     """
     Cierra la conexión a la base de datos MongoDB.
     """
-    global client
+    global client, database
     if client:
-        client.close()
-        print("Conexión a MongoDB cerrada.")
+        await client.close()
+        client = None  # type: ignore
+        database = None  # type: ignore
+        logger.info("Conexión a MongoDB cerrada.")
 
 def get_database():
     """
-    Retorna la instancia de la base de datos MongoDB.
+    Retorna la instancia de la base de datos MongoDB (la misma en todo el proceso).
     """
-    if client:
-        return client[settings.MONGODB_DB_NAME]
+    if database is not None:
+        return database
     raise Exception("La conexión a la base de datos no ha sido establecida.")
 
+@asynccontextmanager
+async def transaction() -> AsyncIterator[Optional[AsyncClientSession]]:
+    """
+    Abre una sesión con una transacción multi-documento si MONGODB_TRANSACTIONS está activo:
+    se confirma al salir del bloque y se aborta si ocurre una excepción.
+    Si está desactivado (MongoDB standalone) entrega None y las operaciones se ejecutan sin sesión.
+    """
+    if not settings.MONGODB_TRANSACTIONS or client is None:
+        yield None
+        return
+    async with client.start_session() as session:
+        async with await session.start_transaction():
+            yield session
+
+# Índices que dejaron de usarse y se eliminan al iniciar, por colección.
+# user_id_1__id_1: el detalle con propietario usa el índice de _id y el listado por usuario,
+# (user_id, created_at); la regla de solicitud activa única usa su índice parcial.
+# status_1_full_name_1: reemplazado por (status, full_name, _id), que cubre el desempate por _id.
+OBSOLETE_INDEXES = {
+    "users": ["status_1_full_name_1"],
+    "requests": ["user_id_1__id_1"],
+}
+
+# Solicitudes activas: las que cuentan para la regla de una sola solicitud por usuario, tipo y período
+ACTIVE_REQUEST_FILTER = {"status": {"$in": ["pending", "accepted"]}}
+
+async def _create_unique_index(
+    collection,
+    index: IndexModel,
+    duplicate_match: Optional[Dict[str, Any]] = None
+) -> None:
+    """
+    Crea un índice único que puede chocar con datos de instalaciones existentes.
+    Si MongoDB lo rechaza (documentos duplicados, o MongoDB < 6.0 para el filtro parcial con $in),
+    se registra el error con los duplicados que lo bloquean y la aplicación arranca igual:
+    la unicidad queda sin garantizar hasta corregir los datos y reiniciar.
+    """
+    try:
+        await collection.create_indexes([index])
+    except OperationFailure as err:
+        keys = list(index.document["key"])
+        try:
+            cursor = await collection.aggregate([
+                {"$match": duplicate_match or {}},
+                {"$group": {"_id": {key: f"${key}" for key in keys}, "count": {"$sum": 1}, "ids": {"$push": "$_id"}}},
+                {"$match": {"count": {"$gt": 1}}},
+                {"$limit": 20},
+            ])
+            duplicates = await cursor.to_list(length=None)
+        except OperationFailure:
+            duplicates = []
+        logger.error(
+            "No se pudo crear el índice único %s.%s (%s). Corrige los duplicados y reinicia; los índices "
+            "parciales con $in requieren MongoDB 6.0 o superior. Duplicados encontrados (máx. 20): %s",
+            collection.name, index.document["name"], err,
+            [{"clave": duplicate["_id"], "ids": [str(_id) for _id in duplicate["ids"]]} for duplicate in duplicates],
+        )
+
 async def create_indexes():
+    """
+    Crea los índices de cada colección con un solo comando por colección.
+    Se conservan los nombres por defecto (email_1, cc_1, ...) para no chocar con los índices ya existentes.
+    """
     db = get_database()
-    await db.users.create_index("email", unique=True)
-    await db.users.create_index("cc", unique=True)
+    await db.users.create_indexes([
+        IndexModel([("email", 1)], unique=True),
+        IndexModel([("cc", 1)], unique=True),
+        # Listado de usuarios filtrado por estado/rol y paginado por _id
+        IndexModel([("status", 1), ("role", 1), ("_id", 1)]),
+        # Listado de administración filtrado por estado y ordenado por nombre (sin distinguir
+        # mayúsculas) con _id como desempate
+        IndexModel([("status", 1), ("full_name", 1), ("_id", 1)], collation=USER_NAME_COLLATION),
+        # Conteo de administradores al degradar/eliminar usuarios
+        IndexModel([("role", 1)]),
+    ])
+    await db.requests.create_indexes([
+        # Listado paginado de solicitudes filtrado por estado/período
+        IndexModel([("status", 1), ("lottery_period", -1), ("created_at", -1)]),
+        # Solicitudes de un usuario (listado /me y listado resumido, más recientes primero)
+        IndexModel([("user_id", 1), ("created_at", -1)]),
+    ])
+    # Una sola solicitud activa (pendiente o aceptada) por usuario, tipo de vehículo y período.
+    # El filtro parcial con $in requiere MongoDB 6.0 o superior.
+    await _create_unique_index(
+        db.requests,
+        IndexModel(
+            [("user_id", 1), ("vehicle_type", 1), ("lottery_period", 1)],
+            unique=True,
+            partialFilterExpression=ACTIVE_REQUEST_FILTER,
+            name="user_vehicle_period_active_unique",
+        ),
+        duplicate_match=ACTIVE_REQUEST_FILTER,
+    )
+    await db.lotteries.create_indexes([
+        # Sorteo por período y asignaciones de un usuario dentro del sorteo (multikey sobre winners)
+        IndexModel([("period", 1), ("winners.user_id", 1)]),
+    ])
+    # Un solo sorteo por período. Las consultas de lottery_period/status sobre 'requests'
+    # ya usan el prefijo (status, lottery_period) del primer índice de solicitudes.
+    await _create_unique_index(db.lotteries, IndexModel([("period", 1)], unique=True))
+    for collection_name, index_names in OBSOLETE_INDEXES.items():
+        for index_name in index_names:
+            try:
+                await db[collection_name].drop_index(index_name)
+                logger.info("Índice obsoleto eliminado: %s.%s", collection_name, index_name)
+            except OperationFailure:
+                pass # No existe (instalación nueva o ya eliminado)
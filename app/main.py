@@ -1,28 +1,50 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from motor.motor_asyncio import AsyncIOMotorDatabase
+from fastapi.responses import ORJSONResponse
+from pymongo.asynchronous.database import AsyncDatabase
 from fastapi.middleware.cors import CORSMiddleware
 
+import asyncio
 import os  # Añadido para leer la variable de entorno PORT
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 
+from app.core.config import settings
+from app.core.profiling import setup_profiling
 from app.database.mongodb import connect_to_mongo, close_mongo_connection, get_database
 from app.modules.auth.router import router as auth_router
 from app.modules.residentes.router import router as resident_router
 from app.modules.solicitudes.router import router as requests_router
 from app.modules.sorteo.router import router as lottery_router
 
+# Logging: los registros se encolan (QueueHandler) y un hilo aparte (QueueListener)
+# los escribe en stderr, de modo que el event loop nunca bloquea en la escritura.
+log_queue: queue.Queue = queue.Queue(-1)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    handlers=[QueueHandler(log_queue)]
+)
+log_listener = QueueListener(log_queue, logging.StreamHandler(), respect_handler_level=True)
+logger = logging.getLogger("parknet")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Función de ciclo de vida de la aplicación FastAPI.
     """
-    print("🚀 Iniciando conexión con MongoDB...")
+    log_listener.start()
+    # uvicorn usa uvloop cuando está instalado (--loop auto/uvloop); se registra para verificarlo
+    logger.info("Event loop: %s", type(asyncio.get_running_loop()).__module__)
+    logger.info("🚀 Iniciando conexión con MongoDB...")
     await connect_to_mongo()
-    print("✅ Conexión a MongoDB establecida.")
+    logger.info("✅ Conexión a MongoDB establecida.")
     yield
-    print("🔌 Cerrando conexión con MongoDB...")
+    logger.info("🔌 Cerrando conexión con MongoDB...")
     await close_mongo_connection()
-    print("✅ Conexión a MongoDB cerrada.")
+    logger.info("✅ Conexión a MongoDB cerrada.")
+    log_listener.stop()
 
 # Crea la instancia de la aplicación FastAPI y asocia el ciclo de vida
 app = FastAPI(
@@ -31,22 +53,25 @@ app = FastAPI(
     version="1.0.0",
     lifespan=lifespan,
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse  # Serialización JSON con orjson
 )
 
-origins = [
-    "http://localhost",
-    "http://localhost:8080",
-    "*"  # Añadido para permitir acceso desde Render (ajústalo según tu frontend)
-]
+# Orígenes permitidos: se configuran con ALLOWED_ORIGINS (ej. el dominio del frontend en Render)
+# y/o ALLOWED_ORIGIN_REGEX. Starlette compila la regex una sola vez.
+origins = [origin.strip() for origin in settings.ALLOWED_ORIGINS.split(",") if origin.strip()]
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
+    allow_origin_regex=settings.ALLOWED_ORIGIN_REGEX or None,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
+# Perfilado opcional de peticiones (PROFILING=1 y ?profile=1), ver app/core/profiling.py
+setup_profiling(app)
+
 # --- Incluye todos los routers de tu aplicación ---
 app.include_router(auth_router)
 app.include_router(resident_router)
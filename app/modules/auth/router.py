@@ -1,23 +1,24 @@
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, HTTPException, status, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.security import OAuth2PasswordRequestForm # Para el endpoint de token
 
-from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.asynchronous.database import AsyncDatabase
 
 from app.database.mongodb import get_database
 from app.modules.auth.service import AuthService
 from app.modules.auth.schemas import Token, UserLogin
 from app.modules.residentes.models import User
 from app.modules.residentes.schemas import ResidentCreate, ResidentOut # Para el registro de residentes
-from app.core.dependencies import get_current_user, get_current_active_admin_user # Para proteger rutas de prueba
+from app.core.dependencies import get_current_user, require_admin # Para proteger rutas de prueba
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
 @router.post("/register", response_model=ResidentOut, status_code=status.HTTP_201_CREATED)
 async def register_new_resident(
     user_data: ResidentCreate,
-    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)]
+    db: Annotated[AsyncDatabase, Depends(get_database)]
 ):
     """
     Permite el registro de un nuevo residente.
@@ -30,7 +31,7 @@ async def register_new_resident(
 @router.post("/token", response_model=Token)
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()], # Formulario estándar para OAuth2
-    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)]
+    db: Annotated[AsyncDatabase, Depends(get_database)]
 ):
     """
     Obtiene un token de acceso JWT.
@@ -47,8 +48,9 @@ async def login_for_access_token(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    token = await auth_service.create_access_token_for_user(user)
-    return token
+    token = auth_service.create_access_token_for_user(user)
+    # Respuesta directa: evita la validación y serialización de response_model en cada login
+    return ORJSONResponse({"access_token": token.access_token, "token_type": token.token_type})
 
 @router.get("/me", response_model=ResidentOut)
 async def read_users_me(
@@ -63,7 +65,7 @@ async def read_users_me(
 
 @router.get("/admin-only", status_code=status.HTTP_200_OK)
 async def admin_only_endpoint(
-    current_admin: Annotated[User, Depends(get_current_active_admin_user)]
+    current_admin: Annotated[User, Depends(require_admin)]
 ):
     """
     Ejemplo de endpoint protegido que solo un administrador activo puede acceder.
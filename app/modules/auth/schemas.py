@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, Field
 from typing import Optional
 
 # --- Esquemas de Autenticación ---
@@ -39,4 +39,5 @@ class TokenData(BaseModel):
     """
     id: Optional[str] = None # Usamos str aquí porque el ObjectId ya estaría serializado a string en el token
     role: Optional[str] = None
-    email: Optional[EmailStr] = None # Puede ser útil para validaciones adicionales o información rápida
\ No newline at end of file
+    email: Optional[str] = None # Emitido por la API (ya validado al registrar); no se revalida en cada petición
+    exp: Optional[float] = None # Expiración (timestamp Unix): las cachés de autenticación la revisan en cada acierto
\ No newline at end of file
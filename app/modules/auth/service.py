@@ -2,57 +2,43 @@ from typing import Optional
 from datetime import datetime, timedelta, timezone
 
 from fastapi import HTTPException, status
-from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.asynchronous.database import AsyncDatabase
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 
 from app.core.config import settings
-from app.core.security import verify_password, get_password_hash, create_access_token
+from app.core.security import verify_password_async, get_password_hash_async, password_needs_rehash, create_access_token
 from app.modules.residentes.models import User # Necesitamos el modelo User
 from app.modules.residentes.schemas import ResidentCreate # Para el registro
+from app.modules.residentes.service import duplicate_user_exception, invalidate_cached_user, new_user_document
 from app.modules.auth.schemas import Token # Para el token de respuesta
-from app.shared.repository import BaseRepository # Usaremos el BaseRepository
+from app.shared.repository import get_repository # Repositorios compartidos
 
 class AuthService:
     """
     Servicio de autenticación para gestionar el registro y login de usuarios.
     GRASP: Information Expert - Es responsable de la lógica de negocio de autenticación.
     """
-    def __init__(self, db: AsyncIOMotorDatabase):
+    def __init__(self, db: AsyncDatabase):
         self.db = db
-        self.user_repository = BaseRepository(self.db["users"], User) # Instancia el repositorio para la colección 'users'
+        self.user_repository = get_repository(self.db, "users", User) # Repositorio compartido para la colección 'users'
 
     async def register_user(self, user_data: ResidentCreate) -> Optional[User]:
-        # Verificaciones de unicidad (email y cc)
-        existing_user_email = await self.user_repository.find_one({"email": user_data.email})
-        if existing_user_email:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="El correo electrónico ya está registrado."
-            )
-            
-        existing_user_cc = await self.user_repository.find_one({"cc": user_data.cc})
-        if existing_user_cc:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="La cédula de ciudadanía ya está registrada."
-            )
-
+        # La unicidad de email y cc la garantizan los índices únicos de la colección:
+        # se inserta directamente y se traduce el DuplicateKeyError (un solo viaje a la BD).
         # Hashear la contraseña
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await get_password_hash_async(user_data.password)
         
-        # Crear la instancia de User directamente
-        new_user = User(
-            full_name=user_data.full_name,
-            cc=user_data.cc,
-            email=user_data.email,
-            hashed_password=hashed_password,
-            apartment=user_data.apartment,
-            phone_number=user_data.phone_number,
-            # No especificamos role ni status, Pydantic usará los valores por defecto
-        ) # type: ignore
+        # Documento del usuario con rol y estado por defecto (ResidentCreate ya validó los datos)
+        new_user = new_user_document(user_data, hashed_password)
         
         # Guardar en la base de datos
-        created_user = await self.user_repository.create(new_user)
+        try:
+            created_user = await self.user_repository.create(new_user)
+        except DuplicateKeyError as err:
+            raise duplicate_user_exception(err)
+        # Descartar una posible entrada negativa en caché para la CC recién registrada
+        invalidate_cached_user(str(created_user.id), created_user.cc)
         
         return created_user
 
@@ -66,8 +52,14 @@ class AuthService:
             return None # Usuario no encontrado
 
         # Verificar la contraseña
-        if not verify_password(password, user.hashed_password):
+        if not user.hashed_password or not await verify_password_async(password, user.hashed_password):
             return None # Contraseña incorrecta
+
+        # Migrar hashes bcrypt (o Argon2 con parámetros antiguos) aprovechando que se conoce la contraseña
+        if password_needs_rehash(user.hashed_password):
+            new_hash = await get_password_hash_async(password)
+            await self.user_repository.update(user.id, {"hashed_password": new_hash})
+            invalidate_cached_user(str(user.id))
         
         # Verificar el estado del usuario (debe estar activo para iniciar sesión)
         if user.status != "active":
@@ -78,7 +70,7 @@ class AuthService:
 
         return user
 
-    async def create_access_token_for_user(self, user: User) -> Token:
+    def create_access_token_for_user(self, user: User) -> Token:
         """
         Crea un token de acceso JWT para un usuario dado.
         """
@@ -86,9 +78,9 @@ class AuthService:
         
         # El payload del token debe contener información mínima pero suficiente para identificar
         # al usuario y sus permisos (rol).
-        # Convertimos el ObjectId del usuario a string para el payload del token.
+        # El repositorio ya entrega el id como string hexadecimal, así que se usa tal cual.
         token_data = {
-            "id": str(user.id),
+            "id": user.id,
             "role": user.role,
             "email": user.email # Incluir email puede ser útil, aunque el login sea por cc
         }
@@ -96,4 +88,5 @@ class AuthService:
         access_token = create_access_token(
             data=token_data, expires_delta=access_token_expires
         )
-        return Token(access_token=access_token, token_type="bearer")
\ No newline at end of file
+        # Los valores ya son válidos: se construye el modelo sin volver a validarlos
+        return Token.model_construct(access_token=access_token, token_type="bearer")
\ No newline at end of file
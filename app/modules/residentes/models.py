@@ -20,9 +20,9 @@ class User(BaseModel):
         description="Correo electrónico, usado para login. Debe ser único en la base de datos",
         examples=["usuario@condominio.com"]
     )
-    hashed_password: str = Field(
-        ...,
-        description="Contraseña hasheada usando bcrypt"
+    hashed_password: Optional[str] = Field(
+        None,
+        description="Contraseña hasheada usando Argon2id (bcrypt en cuentas anteriores a la migración). Se omite en las lecturas proyectadas (ej. autenticación por token)"
     )
     apartment: str = Field(
         ...,
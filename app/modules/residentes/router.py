@@ -1,20 +1,21 @@
 from typing import Annotated, List, Optional, Literal # Importar Literal
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.asynchronous.database import AsyncDatabase
 
 from app.database.mongodb import get_database
 from app.modules.residentes.service import ResidentService
-from app.modules.residentes.schemas import ResidentCreate, ResidentUpdate, AdminUserUpdate, ResidentOut
+from app.modules.residentes.schemas import ResidentCreate, ResidentUpdate, AdminUserUpdate, ResidentOut, ResidentListOut, ResidentBulkOut
 from app.modules.residentes.models import User
-from app.core.dependencies import get_current_active_user, get_current_active_admin_user
+from app.core.dependencies import get_current_active_user, require_admin
+from app.shared.responses import list_response
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
 @router.post("/", response_model=ResidentOut, status_code=status.HTTP_201_CREATED)
 async def create_user_by_admin(
     user_data: ResidentCreate,
-    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
-    current_admin: Annotated[User, Depends(get_current_active_admin_user)] # Solo administradores pueden crear usuarios
+    db: Annotated[AsyncDatabase, Depends(get_database)],
+    current_admin: Annotated[User, Depends(require_admin)] # Solo administradores pueden crear usuarios
 ):
     """
     Crea un nuevo usuario. Por defecto, crea un residente en estado 'pending_approval'.
@@ -30,10 +31,36 @@ async def create_user_by_admin(
     )
     return new_user
 
-@router.get("/", response_model=List[ResidentOut])
+# Máximo de usuarios por carga masiva
+MAX_BULK_USERS = 500
+
+@router.post("/bulk", response_model=ResidentBulkOut, status_code=status.HTTP_201_CREATED)
+async def create_users_bulk_by_admin(
+    users_data: List[ResidentCreate],
+    db: Annotated[AsyncDatabase, Depends(get_database)],
+    current_admin: Annotated[User, Depends(require_admin)] # Solo administradores pueden crear usuarios
+):
+    """
+    Crea varios usuarios en una sola operación (ej. importación de residentes).
+    Los usuarios con email o CC duplicados se reportan en 'errors' sin detener el resto.
+    Si ninguno pudo crearse, responde 400 con la lista de errores.
+    Requiere permisos de administrador.
+    """
+    if not users_data or len(users_data) > MAX_BULK_USERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"La carga masiva debe incluir entre 1 y {MAX_BULK_USERS} usuarios."
+        )
+    resident_service = ResidentService(db)
+    created_users, errors = await resident_service.create_users_bulk(users_data)
+    if not created_users:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=errors)
+    return {"created": created_users, "errors": errors}
+
+@router.get("/", response_model=List[ResidentListOut])
 async def get_all_users(
-    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
-    current_admin: Annotated[User, Depends(get_current_active_admin_user)], # Solo administradores pueden listar todos
+    db: Annotated[AsyncDatabase, Depends(get_database)],
+    current_admin: Annotated[User, Depends(require_admin)], # Solo administradores pueden listar todos
     status_filter: Optional[Literal["pending_approval", "active", "inactive"]] = Query(
         None, 
         description="Filtrar por estado del usuario."
@@ -57,12 +84,13 @@ async def get_all_users(
         status_filter=status_filter, # Pasar el filtro de estado
         role_filter=role_filter # Pasar el filtro de rol
     )
-    return users
+    # Los documentos ya se validaron al leerlos: se serializan sin revalidar response_model
+    return list_response(users, ResidentListOut)
 
 @router.get("/{identifier}", response_model=ResidentOut)
 async def get_user(
     identifier: str, # Este parámetro puede ser ID o CC
-    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
+    db: Annotated[AsyncDatabase, Depends(get_database)],
     current_user: Annotated[User, Depends(get_current_active_user)] # Cualquier usuario activo puede ver su perfil
 ):
     """
@@ -83,7 +111,7 @@ async def get_user(
 @router.put("/me", response_model=ResidentOut)
 async def update_my_profile(
     user_update: ResidentUpdate,
-    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
+    db: Annotated[AsyncDatabase, Depends(get_database)],
     current_user: Annotated[User, Depends(get_current_active_user)] # Un usuario puede actualizar su propio perfil
 ):
     """
@@ -98,8 +126,8 @@ async def update_my_profile(
 async def admin_update_user(
     identifier: str, # Este parámetro puede ser ID o CC
     user_update: AdminUserUpdate,
-    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
-    current_admin: Annotated[User, Depends(get_current_active_admin_user)] # Solo administradores pueden actualizar cualquier usuario
+    db: Annotated[AsyncDatabase, Depends(get_database)],
+    current_admin: Annotated[User, Depends(require_admin)] # Solo administradores pueden actualizar cualquier usuario
 ):
     """
     Actualiza la información de un usuario específico por su ID o Cédula de Ciudadanía (CC).
@@ -113,8 +141,8 @@ async def admin_update_user(
 @router.delete("/{identifier}", status_code=status.HTTP_200_OK)
 async def delete_user_by_admin(
     identifier: str, # Este parámetro puede ser ID o CC
-    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
-    current_admin: Annotated[User, Depends(get_current_active_admin_user)] # Solo administradores pueden eliminar usuarios
+    db: Annotated[AsyncDatabase, Depends(get_database)],
+    current_admin: Annotated[User, Depends(require_admin)] # Solo administradores pueden eliminar usuarios
 ):
     """
     Elimina un usuario por su ID o Cédula de Ciudadanía (CC).
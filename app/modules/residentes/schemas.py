@@ -1,6 +1,6 @@
 from datetime import datetime
-from typing import Optional, Literal
-from pydantic import BaseModel, Field, EmailStr, field_validator
+from typing import List, Optional, Literal
+from pydantic import BaseModel, Field, EmailStr
 
 # --- Esquemas de Entrada (Input Schemas) ---
 
@@ -106,28 +106,27 @@ class VehicleSlotInfo(BaseModel):
     available: bool = Field(..., description="Indica si el slot está disponible")
     request_id: Optional[str] = Field(None, description="ID de la solicitud asociada, si está asignado")
 
-class ResidentOut(BaseModel):
+class ResidentListOut(BaseModel):
     """
-    Esquema para la salida de datos de un residente.
-    No incluye la contraseña hasheada para seguridad.
+    Esquema para la salida de un residente en listados.
+    No incluye la contraseña hasheada ni los slots de vehículos.
     """
-    id: Optional[str] = Field(default=None)
+    id: Optional[str] = Field(default=None) # BaseRepository ya entrega el '_id' convertido a string
     full_name: str
     cc: str
-    email: EmailStr
+    email: str # Ya validado como EmailStr al entrar; en la salida no se vuelve a validar
     apartment: str
     phone_number: str
     role: Literal["residente", "administrador"]
     status: Literal["pending_approval", "active", "inactive"]
+
+class ResidentOut(ResidentListOut):
+    """
+    Esquema para la salida de datos de un residente.
+    No incluye la contraseña hasheada para seguridad.
+    """
     vehicle_slots: dict[Literal["automovil", "motocicleta"], VehicleSlotInfo] # Mapea las claves a VehicleSlotInfo
     
-    # Opcional: Validador para convertir ObjectId a string si es necesario
-    @field_validator("id", mode="before")
-    def validate_id(cls, v):
-        if hasattr(v, "id"):
-            return str(v.id)
-        return str(v)
-    
     class Config:
         json_schema_extra = {
             "example": {
@@ -144,4 +143,21 @@ class ResidentOut(BaseModel):
                     "motocicleta": {"available": True, "request_id": None}
                 }
             }
-        }
\ No newline at end of file
+        }
+
+
+class ResidentBulkError(BaseModel):
+    """
+    Esquema para un usuario que no pudo crearse en una carga masiva.
+    """
+    index: int = Field(..., description="Posición del usuario en la lista enviada")
+    cc: str
+    detail: str
+
+
+class ResidentBulkOut(BaseModel):
+    """
+    Esquema para el resultado de una carga masiva de usuarios.
+    """
+    created: List[ResidentOut]
+    errors: List[ResidentBulkError]
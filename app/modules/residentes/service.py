@@ -1,30 +1,172 @@
-from typing import List, Optional, Dict
+import asyncio
+from threading import Lock
+from typing import Any, List, Optional, Dict, Tuple
 from fastapi import HTTPException, status
-from motor.motor_asyncio import AsyncIOMotorDatabase
-from bson import ObjectId
-from datetime import datetime
+from pymongo.asynchronous.database import AsyncDatabase
+from datetime import datetime, timezone
+from cachetools import TTLCache
+from pymongo.errors import DuplicateKeyError
 
 from app.modules.residentes.models import User
 from app.modules.residentes.schemas import ResidentCreate, ResidentUpdate, AdminUserUpdate
-from app.shared.repository import BaseRepository
-from app.core.security import get_password_hash
+from app.core.config import settings
+from app.shared.repository import get_repository, parse_object_id
+from app.database.mongodb import USER_NAME_COLLATION
+from app.core.security import get_password_hash_async
+from app.core.dependencies import invalidate_user_cache
+from app.modules.solicitudes.cache import invalidate_request_lists
+
+
+# Orden de presentación de los estados de usuario en el listado de administración
+USER_STATUS_RANK = {
+    "$switch": {
+        "branches": [
+            {"case": {"$eq": ["$status", "pending_approval"]}, "then": 0},
+            {"case": {"$eq": ["$status", "active"]}, "then": 1},
+        ],
+        "default": 2,
+    }
+}
+
+# Campos que el listado de administración no devuelve (ver ResidentListOut)
+USER_LIST_PROJECTION = {"_status_rank": 0, "hashed_password": 0, "vehicle_slots": 0}
+
+# Caché de usuarios por identificador: ID -> User y CC -> ID (indirección, para que invalidar
+# por ID baste también para las búsquedas por CC). Los identificadores que no existen se
+# guardan con _USER_NOT_FOUND (caché negativa). USER_CACHE_TTL=0 desactiva la caché.
+_USER_NOT_FOUND = object()
+_identifier_cache: Optional[TTLCache] = (
+    TTLCache(maxsize=10_000, ttl=settings.USER_CACHE_TTL) if settings.USER_CACHE_TTL > 0 else None
+)
+_identifier_cache_lock = Lock()
+
+def invalidate_cached_user(user_id: str, *ccs: Optional[str]) -> None:
+    """
+    Invalida las entradas en caché de un usuario (incluida la caché de autenticación).
+    Debe llamarse después de crear, modificar o eliminar un usuario; 'ccs' son las cédulas
+    afectadas (la anterior y la nueva si cambió, o la recién registrada).
+    """
+    if _identifier_cache is not None:
+        with _identifier_cache_lock:
+            _identifier_cache.pop(str(user_id), None)
+            for cc in ccs:
+                if cc:
+                    _identifier_cache.pop(cc, None)
+    invalidate_user_cache(str(user_id))
+
+
+def _identifier_filter(identifier: str) -> Dict[str, Any]:
+    """
+    Filtro de MongoDB para un usuario identificado por ID o por CC.
+    Una CC (máximo 20 caracteres) nunca es un ObjectId válido de 24, así que no hay ambigüedad.
+    """
+    object_id = parse_object_id(identifier)
+    if object_id is not None:
+        return {"$or": [{"_id": object_id}, {"cc": identifier}]}
+    return {"cc": identifier}
+
+
+def _duplicate_user_detail(key_pattern: Dict[str, Any]) -> str:
+    """
+    Mensaje para una violación de índice único en 'users' según el campo que falló (email o cc).
+    """
+    if "email" in key_pattern:
+        return "El correo electrónico ya está registrado."
+    if "cc" in key_pattern:
+        return "La cédula de ciudadanía ya está registrada."
+    return "El usuario ya está registrado."
+
+
+def new_user_document(
+    user_data: ResidentCreate,
+    hashed_password: str,
+    role: str = "residente",
+    status_initial: str = "pending_approval"
+) -> Dict[str, Any]:
+    """
+    Construye el documento de un usuario nuevo a partir de los datos ya validados por ResidentCreate,
+    sin volver a validarlos con el modelo User. Mantiene los mismos campos y valores por defecto.
+    """
+    return {
+        "full_name": user_data.full_name,
+        "cc": user_data.cc,
+        "email": user_data.email,
+        "hashed_password": hashed_password,
+        "apartment": user_data.apartment,
+        "phone_number": user_data.phone_number,
+        "role": role,
+        "status": status_initial,
+        "vehicle_slots": {
+            "automovil": {"available": True, "request_id": None},
+            "motocicleta": {"available": True, "request_id": None}
+        }
+    }
+
+
+def _user_changed_exception() -> HTTPException:
+    """
+    409 para una escritura condicionada al rol leído cuando otra operación cambió o eliminó al usuario.
+    """
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="El usuario fue modificado por otra operación. Inténtalo de nuevo."
+    )
+
+
+def duplicate_user_exception(err: DuplicateKeyError) -> HTTPException:
+    """
+    Traduce un DuplicateKeyError de la colección 'users' al error 400 correspondiente,
+    usando el campo del índice único que falló (email o cc).
+    """
+    key_pattern = (err.details or {}).get("keyPattern") or {}
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=_duplicate_user_detail(key_pattern))
+
 
 class ResidentService:
     """
     Servicio de lógica de negocio para la gestión de usuarios (residentes y administradores).
     GRASP: Information Expert - Es responsable de la lógica de negocio de los usuarios.
     """
-    def __init__(self, db: AsyncIOMotorDatabase):
+    def __init__(self, db: AsyncDatabase):
         self.db = db
-        self.user_repository = BaseRepository(self.db["users"], User)
+        self.user_repository = get_repository(self.db, "users", User)
 
     async def _get_user_by_identifier(self, identifier: str) -> Optional[User]:
         """
         Método interno para obtener un usuario por ID o CC.
+        Consulta primero la caché de identificadores.
+        """
+        if _identifier_cache is None:
+            return await self._find_user_by_identifier(identifier)
+
+        with _identifier_cache_lock:
+            cached = _identifier_cache.get(identifier)
+            if isinstance(cached, str):
+                # Entrada CC -> ID: resolver el usuario por su ID
+                cached = _identifier_cache.get(cached)
+        if cached is _USER_NOT_FOUND:
+            return None
+        # Si la CC del usuario cambió, la entrada CC -> ID anterior ya no es válida
+        if isinstance(cached, User) and (cached.cc == identifier or str(cached.id) == identifier):
+            return cached
+
+        user = await self._find_user_by_identifier(identifier)
+        with _identifier_cache_lock:
+            if user is None:
+                _identifier_cache[identifier] = _USER_NOT_FOUND
+            else:
+                _identifier_cache[str(user.id)] = user
+                _identifier_cache[user.cc] = str(user.id)
+        return user
+
+    async def _find_user_by_identifier(self, identifier: str) -> Optional[User]:
+        """
+        Busca un usuario en MongoDB por ID o CC.
         """
         # Intentar buscar por ObjectId
-        if ObjectId.is_valid(identifier):
-            user = await self.user_repository.get(identifier)
+        object_id = parse_object_id(identifier)
+        if object_id is not None:
+            user = await self.user_repository.get(object_id)
             if user:
                 return user
         
@@ -58,12 +200,25 @@ class ResidentService:
         if role_filter:
             query["role"] = role_filter
 
-        # Usar find_many para obtener múltiples documentos con paginación
-        users = await self.user_repository.find_many(query, skip=skip, limit=limit)
-
-        # Ordenar en Python: pending_approval > active > inactive
-        status_order = {"pending_approval": 0, "active": 1, "inactive": 2}
-        users.sort(key=lambda user: (status_order.get(user.status, 99), user.full_name.lower()))
+        # Orden en MongoDB: pending_approval > active > inactive y luego nombre sin distinguir
+        # mayúsculas (collation), con _id como desempate para que la paginación sea estable.
+        # Con un estado fijo el rango es constante: se ordena solo por (full_name, _id) y el
+        # índice (status, full_name, _id) con la misma collation resuelve el orden sin ordenar en memoria.
+        if status_filter:
+            sort_stages: List[Dict[str, Any]] = [{"$sort": {"full_name": 1, "_id": 1}}]
+        else:
+            sort_stages = [
+                {"$addFields": {"_status_rank": USER_STATUS_RANK}},
+                {"$sort": {"_status_rank": 1, "full_name": 1, "_id": 1}},
+            ]
+        pipeline = [
+            {"$match": query},
+            *sort_stages,
+            {"$skip": skip},
+            {"$limit": limit},
+            {"$project": USER_LIST_PROJECTION},
+        ]
+        users = await self.user_repository.aggregate(pipeline, collation=USER_NAME_COLLATION)
         
         return users
 
@@ -73,111 +228,155 @@ class ResidentService:
         Valida unicidad de email y CC, hashea la contraseña y asigna rol/estado inicial.
         """
         # Si el administrador proporcionó un rol o estado, usarlo, de lo contrario usar los defaults del método
-        final_role = user_data.role if hasattr(user_data, 'role') and user_data.role else role
-        final_status = user_data.status if hasattr(user_data, 'status') and user_data.status else status_initial
-
-        existing_user_email = await self.user_repository.find_one({"email": user_data.email})
-        if existing_user_email:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="El correo electrónico ya está registrado."
-            )
-        
-        existing_user_cc = await self.user_repository.find_one({"cc": user_data.cc})
-        if existing_user_cc:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="La cédula de ciudadanía ya está registrada."
-            )
+        final_role = user_data.role or role
+        final_status = user_data.status or status_initial
 
-        hashed_password = get_password_hash(user_data.password)
+        # La unicidad de email y CC la garantizan los índices únicos de la colección
+        hashed_password = await get_password_hash_async(user_data.password)
         
-        new_user = User(
-            full_name=user_data.full_name,
-            cc=user_data.cc,
-            email=user_data.email,
-            hashed_password=hashed_password,
-            apartment=user_data.apartment,
-            phone_number=user_data.phone_number,
-            role=final_role,
-            status=final_status
-        ) # type: ignore
+        new_user = new_user_document(user_data, hashed_password, final_role, final_status)
         
-        created_user = await self.user_repository.create(new_user)
+        try:
+            created_user = await self.user_repository.create(new_user)
+        except DuplicateKeyError as err:
+            raise duplicate_user_exception(err)
+        invalidate_cached_user(str(created_user.id), created_user.cc)
         return created_user
 
+    async def create_users_bulk(
+        self,
+        users_data: List[ResidentCreate],
+        role: str = "residente",
+        status_initial: str = "pending_approval"
+    ) -> Tuple[List[User], List[Dict[str, Any]]]:
+        """
+        Crea varios usuarios (carga masiva del administrador) con un solo insert_many.
+        Las contraseñas se hashean en paralelo en el pool de hashing. Los usuarios con email o CC
+        duplicados no detienen la carga: se retornan como errores con su posición en la lista.
+        """
+        hashed_passwords = await asyncio.gather(
+            *(get_password_hash_async(user_data.password) for user_data in users_data)
+        )
+        new_users = [
+            new_user_document(
+                user_data,
+                hashed_password,
+                user_data.role or role,
+                user_data.status or status_initial
+            )
+            for user_data, hashed_password in zip(users_data, hashed_passwords)
+        ]
+
+        created_users, write_errors = await self.user_repository.create_many(new_users)
+
+        errors = []
+        for write_error in write_errors:
+            index = write_error["index"]
+            if write_error.get("code") == 11000:
+                detail = _duplicate_user_detail(write_error.get("keyPattern") or {})
+            else:
+                detail = "No se pudo crear el usuario."
+            errors.append({"index": index, "cc": users_data[index].cc, "detail": detail})
+
+        for created_user in created_users:
+            invalidate_cached_user(str(created_user.id), created_user.cc)
+        return created_users, errors
+
     async def update_user(self, user_id: str, user_update: ResidentUpdate) -> User:
         """
         Actualiza la información de un usuario existente por ID.
+        La búsqueda y la actualización se hacen en una sola operación atómica (find_one_and_update).
         """
-        existing_user = await self._get_user_by_identifier(user_id)
-        if not existing_user:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuario no encontrado.")
-
-        update_data = user_update.model_dump(exclude_unset=True)
+        update_data = user_update.model_dump(exclude_unset=True, exclude_none=True)
         
         if "password" in update_data and update_data["password"]:
-            update_data["hashed_password"] = get_password_hash(update_data["password"])
+            update_data["hashed_password"] = await get_password_hash_async(update_data["password"])
             del update_data["password"]
         
-        update_data["updated_at"] = datetime.utcnow()
+        update_data["updated_at"] = datetime.now(timezone.utc)
 
-        updated_user = await self.user_repository.update(existing_user.id, update_data) # type: ignore
+        try:
+            updated_user = await self.user_repository.find_one_and_update(_identifier_filter(user_id), update_data)
+        except DuplicateKeyError as err:
+            raise duplicate_user_exception(err)
         if not updated_user:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="No se pudo actualizar el usuario.")
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuario no encontrado.")
         
+        invalidate_cached_user(str(updated_user.id), updated_user.cc)
+        # Los listados de solicitudes muestran la cédula y el nombre actuales del residente
+        invalidate_request_lists()
         return updated_user
 
     async def admin_update_user(self, user_id: str, admin_user_update: AdminUserUpdate) -> User:
         """
         Permite a un administrador actualizar cualquier campo de un usuario por ID,
         incluyendo rol y estado.
+        Solo la degradación a residente requiere leer antes el usuario (regla del último administrador).
         """
-        existing_user = await self._get_user_by_identifier(user_id)
-        if not existing_user:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuario no encontrado.")
-
-        update_data = admin_user_update.model_dump(exclude_unset=True)
+        update_data = admin_user_update.model_dump(exclude_unset=True, exclude_none=True)
+        user_filter = _identifier_filter(user_id)
         
-        # Validar si el administrador intenta cambiar su propio rol a residente
-        if existing_user.role == "administrador" and "role" in update_data and update_data["role"] == "residente":
-            admin_count = await self.user_repository.count({"role": "administrador"})
-            if admin_count <= 1:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="No puedes degradar al último administrador del sistema."
-                )
+        # Validar si el administrador intenta cambiar su propio rol a residente.
+        # La lectura no usa la caché de identificadores: en otro worker el rol pudo cambiar
+        # y una copia desactualizada saltaría la regla del último administrador.
+        if update_data.get("role") == "residente":
+            existing_user = await self._find_user_by_identifier(user_id)
+            if not existing_user:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuario no encontrado.")
+            if existing_user.role == "administrador":
+                admin_count = await self.user_repository.count({"role": "administrador"}, limit=2)
+                if admin_count <= 1:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="No puedes degradar al último administrador del sistema."
+                    )
+            # La escritura solo se aplica si el rol sigue siendo el que se verificó
+            user_filter = {"_id": parse_object_id(existing_user.id), "role": existing_user.role}
 
         if "password" in update_data and update_data["password"]:
-            update_data["hashed_password"] = get_password_hash(update_data["password"])
+            update_data["hashed_password"] = await get_password_hash_async(update_data["password"])
             del update_data["password"]
         
-        update_data["updated_at"] = datetime.utcnow()
+        update_data["updated_at"] = datetime.now(timezone.utc)
 
-        updated_user = await self.user_repository.update(existing_user.id, update_data) # type: ignore
+        try:
+            updated_user = await self.user_repository.find_one_and_update(user_filter, update_data)
+        except DuplicateKeyError as err:
+            raise duplicate_user_exception(err)
         if not updated_user:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="No se pudo actualizar el usuario.")
+            if update_data.get("role") == "residente":
+                raise _user_changed_exception()
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuario no encontrado.")
         
+        # user_id puede ser la CC anterior si el administrador la cambió
+        invalidate_cached_user(str(updated_user.id), user_id, updated_user.cc)
+        invalidate_request_lists()
         return updated_user
 
     async def delete_user(self, user_id: str) -> Dict[str, str]:
         """
         Elimina un usuario por su ID.
+        La lectura no usa la caché de identificadores (ver admin_update_user) y la eliminación
+        solo se aplica si el rol sigue siendo el que se verificó.
         """
-        user_to_delete = await self._get_user_by_identifier(user_id)
+        user_to_delete = await self._find_user_by_identifier(user_id)
         if not user_to_delete:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuario no encontrado.")
         
         if user_to_delete.role == "administrador":
-            admin_count = await self.user_repository.count({"role": "administrador"})
+            admin_count = await self.user_repository.count({"role": "administrador"}, limit=2)
             if admin_count <= 1:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="No se puede eliminar el último usuario administrador del sistema."
                 )
         
-        deleted = await self.user_repository.delete(user_to_delete.id) # type: ignore
+        deleted = await self.user_repository.find_one_and_delete(
+            {"_id": parse_object_id(user_to_delete.id), "role": user_to_delete.role}
+        )
         if not deleted:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="No se pudo eliminar el usuario.")
+            raise _user_changed_exception()
         
+        invalidate_cached_user(str(user_to_delete.id), user_to_delete.cc)
+        invalidate_request_lists()
         return {"message": "Usuario eliminado exitosamente."}
\ No newline at end of file
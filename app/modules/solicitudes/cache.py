@@ -0,0 +1,55 @@
+# app/modules/solicitudes/cache.py
+"""
+Caché de páginas del listado de solicitudes de administración.
+
+Vive en su propio módulo (sin dependencias de otros servicios) para que tanto el servicio de
+solicitudes como el de residentes puedan invalidarla sin importarse entre sí: los listados
+muestran la cédula y el nombre actuales del residente, así que editar o eliminar un usuario
+también debe vaciarla.
+"""
+from threading import Lock
+from typing import Any, Optional, Tuple
+
+from cachetools import TTLCache
+
+from app.core.config import settings
+
+# Caché de páginas del listado de administración, por (consulta, filtros, skip, limit).
+# Cualquier escritura sobre solicitudes o usuarios en este proceso la vacía; entre workers el desfase
+# máximo es REQUEST_LIST_CACHE_TTL. REQUEST_LIST_CACHE_TTL=0 desactiva la caché.
+_request_list_cache: Optional[TTLCache] = (
+    TTLCache(maxsize=256, ttl=settings.REQUEST_LIST_CACHE_TTL) if settings.REQUEST_LIST_CACHE_TTL > 0 else None
+)
+_request_list_cache_lock = Lock()
+# Se incrementa en cada invalidación: una consulta que empezó antes no guarda su resultado
+_request_list_generation = 0
+
+
+def invalidate_request_lists() -> None:
+    """
+    Vacía la caché de páginas de solicitudes. Debe llamarse después de crear, modificar o eliminar
+    solicitudes, y después de modificar o eliminar usuarios (cédula y nombre mostrados en el listado).
+    """
+    global _request_list_generation
+    if _request_list_cache is not None:
+        with _request_list_cache_lock:
+            _request_list_generation += 1
+            _request_list_cache.clear()
+
+
+async def cached_request_list(key: Tuple[Any, ...], load):
+    """
+    Retorna la página en caché para 'key' o la calcula con load() y la guarda.
+    """
+    if _request_list_cache is None:
+        return await load()
+    with _request_list_cache_lock:
+        cached = _request_list_cache.get(key)
+        generation = _request_list_generation
+    if cached is not None:
+        return cached
+    result = await load()
+    with _request_list_cache_lock:
+        if generation == _request_list_generation:
+            _request_list_cache[key] = result
+    return result
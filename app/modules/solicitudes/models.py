@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional, Literal
 from pydantic import BaseModel, Field
 from bson import ObjectId # Importar ObjectId para referencia interna si se necesitara tipado exacto, aunque lo manejaremos como str
@@ -39,8 +39,8 @@ class Request(BaseModel):
     )
 
     # Marcas de tiempo
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
     class Config:
         populate_by_name = True # Permite que los campos se mapeen por su alias (_id)
@@ -1,19 +1,21 @@
 from typing import Annotated, List, Literal, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from motor.motor_asyncio import AsyncIOMotorDatabase
+from fastapi.responses import ORJSONResponse
+from pymongo.asynchronous.database import AsyncDatabase
 
 from app.database.mongodb import get_database
 from app.modules.solicitudes.service import RequestService
-from app.modules.solicitudes.schemas import RequestCreate, RequestUpdateStatus, RequestOut
+from app.modules.solicitudes.schemas import RequestCreate, RequestUpdateStatus, RequestBulkUpdateStatus, RequestOut, RequestListOut, RequestBulkStatusOut, RequestSummaryOut
 from app.modules.residentes.models import User # Necesario para los tipos de dependencia
-from app.core.dependencies import get_current_active_user, get_current_active_admin_user
+from app.core.dependencies import get_current_active_user, require_admin
+from app.shared.responses import list_response
 
 router = APIRouter(prefix="/requests", tags=["Requests"])
 
 @router.post("/", response_model=RequestOut, status_code=status.HTTP_201_CREATED)
 async def create_request(
     request_data: RequestCreate,
-    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
+    db: Annotated[AsyncDatabase, Depends(get_database)],
     current_user: Annotated[User, Depends(get_current_active_user)] # Solo usuarios activos pueden crear solicitudes
 ):
     """
@@ -25,7 +27,7 @@ async def create_request(
 
 @router.get("/me", response_model=List[RequestOut])
 async def get_my_requests(
-    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
+    db: Annotated[AsyncDatabase, Depends(get_database)],
     current_user: Annotated[User, Depends(get_current_active_user)], # Un usuario puede ver sus propias solicitudes
     skip: int = Query(0, ge=0),
     limit: int = Query(100, le=200)
@@ -35,12 +37,52 @@ async def get_my_requests(
     """
     request_service = RequestService(db)
     requests = await request_service.get_user_requests(str(current_user.id), skip=skip, limit=limit)
-    return requests
+    # Los documentos ya se validaron al leerlos: se serializan sin revalidar response_model
+    return list_response(requests, RequestOut)
+
+@router.get("/me/summary", response_model=List[RequestSummaryOut])
+async def get_my_request_summaries(
+    db: Annotated[AsyncDatabase, Depends(get_database)],
+    current_user: Annotated[User, Depends(get_current_active_user)], # Un usuario puede ver sus propias solicitudes
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=200)
+):
+    """
+    Obtiene el listado resumido de las solicitudes del usuario autenticado, más recientes primero.
+    Solo incluye tipo de vehículo, placa, estado, período y fecha de creación.
+    """
+    request_service = RequestService(db)
+    summaries = await request_service.get_user_request_summaries(str(current_user.id), skip=skip, limit=limit)
+    # Documentos proyectados desde MongoDB: se serializan directamente, sin modelos intermedios
+    return ORJSONResponse(summaries)
+
+@router.get("/paged", response_model=RequestListOut)
+async def get_requests_paged(
+    db: Annotated[AsyncDatabase, Depends(get_database)],
+    current_admin: Annotated[User, Depends(require_admin)], # Solo administradores pueden listar todas las solicitudes
+    status_filter: Optional[Literal["pending", "accepted", "rejected"]] = Query(None, description="Filtrar por estado de la solicitud"),
+    lottery_period_filter: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="Filtrar por período de sorteo (YYYY-MM)"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=200)
+):
+    """
+    Obtiene una página de solicitudes de parqueo junto con el total de coincidencias.
+    Requiere permisos de administrador.
+    Mismo orden que el listado completo: pendientes, luego aceptadas, luego rechazadas.
+    """
+    request_service = RequestService(db)
+    requests, total = await request_service.get_all_requests_paged(
+        status_filter=status_filter,
+        lottery_period_filter=lottery_period_filter,
+        skip=skip,
+        limit=limit
+    )
+    return list_response(requests, RequestOut, total=total, skip=skip, limit=limit)
 
 @router.get("/{request_id}", response_model=RequestOut)
 async def get_request_details(
     request_id: str,
-    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
+    db: Annotated[AsyncDatabase, Depends(get_database)],
     current_user: Annotated[User, Depends(get_current_active_user)] # Un usuario puede ver su propia solicitud, un admin cualquier solicitud
 ):
     """
@@ -48,24 +90,20 @@ async def get_request_details(
     Los usuarios pueden ver sus propias solicitudes. Los administradores pueden ver cualquier solicitud.
     """
     request_service = RequestService(db)
-    request = await request_service.get_request_by_id(request_id)
-
-    # Lógica de autorización: Un usuario solo puede ver sus propias solicitudes, a menos que sea un admin
-    if str(current_user.id) != request.user_id and current_user.role != "administrador":
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="No tienes permiso para ver esta solicitud."
-        )
+    # Lógica de autorización: Un usuario solo puede ver sus propias solicitudes, a menos que sea un admin.
+    # La propiedad se filtra en la consulta, por lo que una solicitud ajena responde 404.
+    owner_id = None if current_user.role == "administrador" else str(current_user.id)
+    request = await request_service.get_request_by_id(request_id, owner_id=owner_id)
     return request
 
 @router.get("/", response_model=List[RequestOut])
 async def get_all_requests(
-    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
-    current_admin: Annotated[User, Depends(get_current_active_admin_user)], # Solo administradores pueden listar todas las solicitudes
+    db: Annotated[AsyncDatabase, Depends(get_database)],
+    current_admin: Annotated[User, Depends(require_admin)], # Solo administradores pueden listar todas las solicitudes
     status_filter: Optional[Literal["pending", "accepted", "rejected"]] = Query(None, description="Filtrar por estado de la solicitud"),
     lottery_period_filter: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="Filtrar por período de sorteo (YYYY-MM)"),
     skip: int = Query(0, ge=0),
-    limit: int = Query(100, le=200)
+    limit: int = Query(100, ge=1, le=200)
 ):
     """
     Obtiene una lista de todas las solicitudes de parqueo con filtros y paginación.
@@ -79,14 +117,31 @@ async def get_all_requests(
         skip=skip,
         limit=limit
     )
-    return requests
+    return list_response(requests, RequestOut)
+
+@router.put("/bulk/status", response_model=RequestBulkStatusOut)
+async def bulk_update_request_status(
+    status_update: RequestBulkUpdateStatus,
+    db: Annotated[AsyncDatabase, Depends(get_database)],
+    current_admin: Annotated[User, Depends(require_admin)] # Solo administradores pueden actualizar el estado
+):
+    """
+    Actualiza el estado de varias solicitudes de parqueo en una sola operación.
+    Los IDs que no corresponden a ninguna solicitud se reportan en 'not_found'.
+    Requiere permisos de administrador.
+    """
+    request_service = RequestService(db)
+    updated_requests, not_found = await request_service.bulk_update_status(
+        status_update.request_ids, status_update.status
+    )
+    return {"updated": updated_requests, "not_found": not_found}
 
 @router.put("/{request_id}/status", response_model=RequestOut)
 async def update_request_status(
     request_id: str,
     status_update: RequestUpdateStatus,
-    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
-    current_admin: Annotated[User, Depends(get_current_active_admin_user)] # Solo administradores pueden actualizar el estado
+    db: Annotated[AsyncDatabase, Depends(get_database)],
+    current_admin: Annotated[User, Depends(require_admin)] # Solo administradores pueden actualizar el estado
 ):
     """
     Actualiza el estado de una solicitud de parqueo específica por su ID.
@@ -99,8 +154,8 @@ async def update_request_status(
 @router.delete("/{request_id}", status_code=status.HTTP_200_OK)
 async def delete_request(
     request_id: str,
-    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
-    current_admin: Annotated[User, Depends(get_current_active_admin_user)] # Solo administradores pueden eliminar solicitudes
+    db: Annotated[AsyncDatabase, Depends(get_database)],
+    current_admin: Annotated[User, Depends(require_admin)] # Solo administradores pueden eliminar solicitudes
 ):
     """
     Elimina una solicitud de parqueo por su ID.
@@ -1,6 +1,6 @@
 from datetime import datetime
-from typing import Optional, Literal
-from pydantic import BaseModel, Field, field_validator
+from typing import List, Optional, Literal
+from pydantic import BaseModel, Field
 
 # --- Esquemas de Entrada (Input Schemas) ---
 
@@ -49,13 +49,28 @@ class RequestUpdateStatus(BaseModel):
             }
         }
 
+class RequestBulkUpdateStatus(BaseModel):
+    """
+    Esquema para que un administrador actualice el estado de varias solicitudes a la vez.
+    """
+    request_ids: List[str] = Field(..., min_length=1, max_length=500, description="IDs de las solicitudes a actualizar.")
+    status: Literal["pending", "accepted", "rejected"] = Field(..., description="Nuevo estado de las solicitudes.")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "request_ids": ["666c8a7f7b1e3e4d5f6a2b1e", "666d9b8c7d1e3f4a5b6c2d1e"],
+                "status": "accepted"
+            }
+        }
+
 # --- Esquemas de Salida (Output Schemas) ---
 
 class RequestOut(BaseModel):
     """
     Esquema para la salida de datos de una solicitud de parqueo.
     """
-    id: Optional[str] = Field(None, examples=["666c8a7f7b1e3e4d5f6a2b1e"])
+    id: Optional[str] = Field(None, examples=["666c8a7f7b1e3e4d5f6a2b1e"]) # BaseRepository ya entrega el '_id' convertido a string
     user_id: str
     resident_cc: str
     resident_full_name: str
@@ -68,13 +83,6 @@ class RequestOut(BaseModel):
     lottery_period: str
     created_at: datetime
     updated_at: datetime
-    
-    @field_validator("id", mode="before")
-    def convert_objectid_to_str(cls, v):
-        """Convierte ObjectId a str para asegurar la compatibilidad con Pydantic."""
-        if isinstance(v, datetime): # A veces el validator puede recibir otros tipos si no está bien encadenado.
-            return str(v)
-        return str(v) if v is not None else None
 
     class Config:
         populate_by_name = True
@@ -97,4 +105,36 @@ class RequestOut(BaseModel):
                 "created_at": "2025-06-15T00:00:00.000Z",
                 "updated_at": "2025-06-15T00:00:00.000Z"
             }
-        }
\ No newline at end of file
+        }
+
+
+class RequestSummaryOut(BaseModel):
+    """
+    Esquema resumido de una solicitud para el listado del residente (sin descripción ni datos del residente).
+    """
+    id: str
+    vehicle_type: Literal["automovil", "motocicleta"]
+    license_plate: str
+    status: Literal["pending", "accepted", "rejected"]
+    lottery_period: str
+    created_at: datetime
+
+
+class RequestListOut(BaseModel):
+    """
+    Esquema para una página de solicitudes junto con el total de coincidencias,
+    para que la paginación no necesite una segunda consulta.
+    """
+    items: List[RequestOut]
+    total: int = Field(..., description="Número total de solicitudes que cumplen los filtros")
+    skip: int
+    limit: int
+
+
+class RequestBulkStatusOut(BaseModel):
+    """
+    Resultado de una actualización masiva de estado: las solicitudes resultantes
+    y los IDs que no corresponden a ninguna solicitud.
+    """
+    updated: List[RequestOut]
+    not_found: List[str]
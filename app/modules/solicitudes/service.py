@@ -1,23 +1,90 @@
 # app/modules/solicitudes/service.py
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from fastapi import HTTPException, status
-from motor.motor_asyncio import AsyncIOMotorDatabase
-from datetime import datetime
-from bson import ObjectId
+from pymongo.asynchronous.database import AsyncDatabase
+from datetime import datetime, timezone
+import re
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
 from app.modules.solicitudes.models import Request
 from app.modules.solicitudes.schemas import RequestCreate, RequestUpdateStatus
 from app.modules.residentes.models import User
-from app.shared.repository import BaseRepository
+from app.shared.repository import get_repository, parse_object_id
+from app.database.mongodb import transaction
+from app.modules.residentes.service import invalidate_cached_user
+from app.modules.solicitudes.cache import invalidate_request_lists, cached_request_list
+
+# Forma de un ObjectId en texto (24 caracteres hexadecimales), compilada una sola vez
+_HEX24 = re.compile(r"[0-9a-fA-F]{24}")
+
+# Orden de presentación de los estados de solicitud: pending > accepted > rejected
+REQUEST_STATUS_RANK = {
+    "$switch": {
+        "branches": [
+            {"case": {"$eq": ["$status", "pending"]}, "then": 0},
+            {"case": {"$eq": ["$status", "accepted"]}, "then": 1},
+        ],
+        "default": 2,
+    }
+}
+
+
+def _slot_update(request: Request, new_status: str) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """
+    Filtro y $set sobre el usuario dueño de la solicitud para reflejar su nuevo estado en 'vehicle_slots'.
+    Se actualiza solo la ruta del tipo de vehículo, sin leer al usuario. Al liberar ('rejected',
+    'pending' o eliminación) el filtro exige que el slot siga apuntando a esta solicitud.
+    Retorna None si el user_id no es un ObjectId válido.
+    """
+    user_object_id = parse_object_id(request.user_id)
+    if user_object_id is None:
+        return None
+    slot_path = f"vehicle_slots.{request.vehicle_type}"
+    if new_status == "accepted":
+        return {"_id": user_object_id}, {slot_path: {"available": False, "request_id": request.id}}
+    return (
+        {"_id": user_object_id, f"{slot_path}.request_id": request.id},
+        {slot_path: {"available": True, "request_id": None}},
+    )
+
+
+# Etapas que reemplazan la cédula y el nombre guardados en la solicitud al crearla por los
+# actuales del residente ($lookup a 'users'); si el usuario ya no existe se conserva la copia.
+# Se aplican después de paginar, así que el join solo recorre la página.
+RESIDENT_LOOKUP_STAGES: List[Dict[str, Any]] = [
+    {"$lookup": {
+        "from": "users",
+        "let": {"user_object_id": {"$convert": {"input": "$user_id", "to": "objectId", "onError": None, "onNull": None}}},
+        "pipeline": [
+            {"$match": {"$expr": {"$eq": ["$_id", "$$user_object_id"]}}},
+            {"$project": {"_id": 0, "cc": 1, "full_name": 1}},
+        ],
+        "as": "_resident",
+    }},
+    {"$set": {
+        "resident_cc": {"$ifNull": [{"$first": "$_resident.cc"}, "$resident_cc"]},
+        "resident_full_name": {"$ifNull": [{"$first": "$_resident.full_name"}, "$resident_full_name"]},
+    }},
+]
+
+# Campos del listado resumido de solicitudes de un residente (ver RequestSummaryOut)
+REQUEST_SUMMARY_PROJECTION = {
+    "vehicle_type": 1,
+    "license_plate": 1,
+    "status": 1,
+    "lottery_period": 1,
+    "created_at": 1,
+}
 
 class RequestService:
     """
     Servicio de lógica de negocio para la gestión de solicitudes de parqueo.
     """
-    def __init__(self, db: AsyncIOMotorDatabase):
+    def __init__(self, db: AsyncDatabase):
         self.db = db
-        self.request_repository = BaseRepository(self.db["requests"], Request)
-        self.user_repository = BaseRepository(self.db["users"], User)
+        self.request_repository = get_repository(self.db, "requests", Request)
+        self.user_repository = get_repository(self.db, "users", User)
 
     async def create_request(self, request_data: RequestCreate, current_user: User) -> Request:
         """
@@ -30,21 +97,6 @@ class RequestService:
         2. Si no existe solicitud para ese período o si existe pero está rechazada, se permite crear una nueva solicitud.
         3. Las solicitudes para diferentes períodos son completamente independientes.
         """
-        # Verificar si el usuario ya tiene una solicitud pendiente o aceptada para el mismo tipo de vehículo y período
-        existing_request = await self.request_repository.find_one({
-            "user_id": str(current_user.id),
-            "vehicle_type": request_data.vehicle_type,
-            "lottery_period": request_data.lottery_period,
-            "status": {"$in": ["pending", "accepted"]}
-        })
-
-        if existing_request:
-            # Si existe una solicitud activa (pendiente o aceptada) para el mismo período, rechazamos la nueva
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Ya tienes una solicitud {existing_request.status} para '{request_data.vehicle_type}' en el período {request_data.lottery_period}."
-            )
-
         # Construir el objeto Request
         new_request = Request(
             user_id=str(current_user.id),
@@ -59,14 +111,31 @@ class RequestService:
             status="pending"
         ) # type: ignore
         
-        created_request = await self.request_repository.create(new_request)
+        # La regla 1 la garantiza el índice único parcial (user_id, vehicle_type, lottery_period)
+        # sobre las solicitudes pendientes o aceptadas: se inserta directamente, sin consulta previa.
+        try:
+            created_request = await self.request_repository.create(new_request)
+        except DuplicateKeyError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Ya tienes una solicitud pendiente o aceptada para '{request_data.vehicle_type}' en el período {request_data.lottery_period}."
+            )
+        invalidate_request_lists()
         return created_request
 
-    async def get_request_by_id(self, request_id: str) -> Request:
+    async def get_request_by_id(self, request_id: str, owner_id: Optional[str] = None) -> Request:
         """
         Obtiene una solicitud por su ID.
+        Si se indica owner_id, la solicitud debe pertenecer a ese usuario; la condición va en la
+        consulta, así que una solicitud ajena responde 404 igual que una inexistente.
         """
-        request = await self.request_repository.get(request_id)
+        object_id = parse_object_id(request_id)
+        if object_id is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Solicitud no encontrada.")
+        query: Dict[str, Any] = {"_id": object_id}
+        if owner_id is not None:
+            query["user_id"] = owner_id
+        request = await self.request_repository.find_one(query)
         if not request:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Solicitud no encontrada.")
         return request
@@ -75,13 +144,26 @@ class RequestService:
         """
         Obtiene todas las solicitudes de un usuario específico.
         """
-        if not ObjectId.is_valid(user_id):
+        if not _HEX24.fullmatch(user_id):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ID de usuario inválido.")
             
         # CORRECCIÓN: Usar find_many en lugar de find
         requests = await self.request_repository.find_many({"user_id": user_id}, skip=skip, limit=limit)
         return requests
 
+    async def get_user_request_summaries(self, user_id: str, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Obtiene el listado resumido de las solicitudes de un usuario, más recientes primero.
+        Solo se leen los campos de REQUEST_SUMMARY_PROJECTION y no se validan con el modelo Request.
+        """
+        return await self.request_repository.find_many_raw(
+            {"user_id": user_id},
+            REQUEST_SUMMARY_PROJECTION,
+            skip=skip,
+            limit=limit,
+            sort=[("created_at", -1)]
+        )
+
     async def get_all_requests(
         self, 
         status_filter: Optional[str] = None, 
@@ -92,95 +174,208 @@ class RequestService:
         """
         Obtiene una lista de todas las solicitudes, con filtros y paginación.
         Prioriza el orden: pending, then accepted, then rejected.
+        El orden y la paginación se resuelven en MongoDB: solo se traen y validan las solicitudes de la página.
+        La cédula y el nombre del residente son los actuales (RESIDENT_LOOKUP_STAGES).
         """
-        query = {}
+        query: Dict[str, Any] = {}
         if status_filter:
             query["status"] = status_filter
         if lottery_period_filter:
             query["lottery_period"] = lottery_period_filter
 
-        # CORRECCIÓN: Usar find_many en lugar de find
-        all_requests = await self.request_repository.find_many(query, skip=0, limit=0)  # Obtener todos sin paginación inicial
-        
-        # Ordenar en Python: pending > accepted > rejected
-        status_order = {"pending": 0, "accepted": 1, "rejected": 2}
-        all_requests.sort(key=lambda req: status_order.get(req.status, 99))
-        
-        # Aplicar paginación después del ordenamiento
-        return all_requests[skip : skip + limit]
+        # pending > accepted > rejected; dentro de cada estado, orden de inserción (_id)
+        pipeline = [
+            {"$match": query},
+            {"$addFields": {"_status_rank": REQUEST_STATUS_RANK}},
+            {"$sort": {"_status_rank": 1, "_id": 1}},
+            {"$skip": skip},
+            {"$limit": limit},
+            *RESIDENT_LOOKUP_STAGES,
+            {"$project": {"_status_rank": 0, "_resident": 0}},
+        ]
+        return await cached_request_list(
+            ("list", status_filter, lottery_period_filter, skip, limit),
+            lambda: self.request_repository.aggregate(pipeline)
+        )
+
+    async def get_all_requests_paged(
+        self, 
+        status_filter: Optional[str] = None, 
+        lottery_period_filter: Optional[str] = None, 
+        skip: int = 0, 
+        limit: int = 100
+    ) -> Tuple[List[Request], int]:
+        """
+        Obtiene una página de solicitudes y el total de coincidencias en una sola agregación ($facet).
+        Orden: pending, accepted, rejected; dentro de cada estado, período y fecha de creación más recientes primero.
+        La cédula y el nombre del residente son los actuales (RESIDENT_LOOKUP_STAGES).
+        """
+        query: Dict[str, Any] = {}
+        if status_filter:
+            query["status"] = status_filter
+        if lottery_period_filter:
+            query["lottery_period"] = lottery_period_filter
+
+        page_stages = [
+            {"$addFields": {"_status_rank": REQUEST_STATUS_RANK}},
+            {"$sort": {"_status_rank": 1, "lottery_period": -1, "created_at": -1, "_id": 1}},
+        ]
+        requests, total = await cached_request_list(
+            ("paged", status_filter, lottery_period_filter, skip, limit),
+            lambda: self.request_repository.aggregate_paged(
+                [{"$match": query}], page_stages, skip=skip, limit=limit,
+                item_stages=RESIDENT_LOOKUP_STAGES + [{"$project": {"_status_rank": 0, "_resident": 0}}]
+            )
+        )
+        return requests, total
 
     async def update_request_status(self, request_id: str, new_status: str) -> Request:
         """
         Permite a un administrador actualizar el estado de una solicitud.
         También actualiza los slots de vehículos del usuario si la solicitud es aceptada/rechazada.
         """
-        request = await self.request_repository.get(request_id)
-        if not request:
+        object_id = parse_object_id(request_id)
+        if object_id is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Solicitud no encontrada.")
 
-        if request.status == new_status:
+        # Lectura y escritura en una sola operación atómica; el filtro $ne hace que una llamada
+        # con el mismo estado no modifique nada. Con MONGODB_TRANSACTIONS la solicitud y el slot
+        # del usuario se confirman juntos.
+        now = datetime.now(timezone.utc)
+        slot_update = None
+        try:
+            async with transaction() as session:
+                updated_request = await self.request_repository.find_one_and_update(
+                    {"_id": object_id, "status": {"$ne": new_status}},
+                    {"status": new_status, "updated_at": now},
+                    session=session
+                )
+                if updated_request:
+                    # Actualizar el slot del vehículo en 'vehicle_slots' del usuario
+                    slot_update = _slot_update(updated_request, new_status)
+                    if slot_update:
+                        user_filter, slot_data = slot_update
+                        await self.user_repository.update_one(
+                            user_filter, {**slot_data, "updated_at": now}, session=session
+                        )
+        except DuplicateKeyError:
+            # Volver a activar una solicitud cuando el usuario ya tiene otra activa para ese tipo y período
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="El usuario ya tiene otra solicitud pendiente o aceptada para ese tipo de vehículo y período."
+            )
+
+        if not updated_request:
+            # No existe, o ya tenía ese estado
+            request = await self.request_repository.get(object_id)
+            if not request:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Solicitud no encontrada.")
             return request
+        invalidate_request_lists()
+        if slot_update:
+            invalidate_cached_user(updated_request.user_id)
 
-        update_data = {"status": new_status, "updated_at": datetime.utcnow()}
-        updated_request = await self.request_repository.update(request_id, update_data)
+        return updated_request
 
-        if not updated_request:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="No se pudo actualizar el estado de la solicitud.")
-        
-        # Actualizar el campo 'vehicle_slots' del usuario
-        user = await self.user_repository.get(updated_request.user_id)
-        if user:
-            vehicle_type = updated_request.vehicle_type
-            user_vehicle_slots = user.vehicle_slots.copy()  # Crear copia para modificar
-            
-            if new_status == "accepted":
-                user_vehicle_slots[vehicle_type] = {
-                    "available": False,
-                    "request_id": str(updated_request.id)
-                }
-            elif new_status in ["rejected", "pending"]:
-                if user_vehicle_slots.get(vehicle_type, {}).get("request_id") == str(updated_request.id):
-                    user_vehicle_slots[vehicle_type] = {
-                        "available": True,
-                        "request_id": None
-                    }
-                
-            # Persistir los cambios en el usuario
-            await self.user_repository.update(
-                str(user.id), 
-                {"vehicle_slots": user_vehicle_slots, "updated_at": datetime.utcnow()}
+    async def bulk_update_status(self, request_ids: List[str], new_status: str) -> Tuple[List[Request], List[str]]:
+        """
+        Actualiza el estado de varias solicitudes con un número fijo de viajes a la BD:
+        una lectura con $in y un bulk_write por colección, en lugar de 3-4 operaciones por solicitud.
+        Los slots de los usuarios se actualizan por ruta con _slot_update, sin leer los usuarios.
+        Retorna las solicitudes resultantes y los IDs que no se encontraron.
+        """
+        # Indexado por el ID normalizado (str(ObjectId), hexadecimal en minúsculas), que es como
+        # vuelve request.id: un ID válido en mayúsculas no debe quedar como no encontrado
+        object_ids = {}
+        normalized_ids = {} # ID recibido -> ID normalizado (None si no es un ObjectId válido)
+        for request_id in dict.fromkeys(request_ids): # Sin duplicados, conservando el orden
+            object_id = parse_object_id(request_id)
+            normalized_ids[request_id] = str(object_id) if object_id is not None else None
+            if object_id is not None:
+                object_ids[str(object_id)] = object_id
+
+        requests = await self.request_repository.find_many(
+            {"_id": {"$in": list(object_ids.values())}}, limit=0
+        )
+        found = {request.id for request in requests}
+        not_found = [
+            request_id for request_id, normalized_id in normalized_ids.items()
+            if normalized_id not in found
+        ]
+
+        now = datetime.now(timezone.utc)
+        results = []
+        changes = [] # (solicitud, operación sobre la solicitud, operación sobre el usuario o None)
+        for request in requests:
+            if request.status == new_status:
+                results.append(request)
+                continue
+            request_op = UpdateOne(
+                {"_id": object_ids[request.id]},
+                {"$set": {"status": new_status, "updated_at": now}}
             )
+            user_op = None
+            slot_update = _slot_update(request, new_status)
+            if slot_update:
+                user_filter, slot_data = slot_update
+                user_op = UpdateOne(user_filter, {"$set": {**slot_data, "updated_at": now}})
+            changes.append((request, request_op, user_op))
 
-        return updated_request
+        # Una solicitud que choca con el índice único de solicitudes activas (ej. volver a 'pending'
+        # cuando ya hay otra activa) no detiene el resto y conserva su estado
+        failed = set()
+        try:
+            await self.request_repository.bulk_write([request_op for _, request_op, _ in changes], ordered=False)
+        except BulkWriteError as err:
+            failed = {error["index"] for error in err.details.get("writeErrors", [])}
+
+        if len(failed) < len(changes):
+            invalidate_request_lists()
+
+        user_ops = []
+        affected_users = set()
+        for index, (request, _, user_op) in enumerate(changes):
+            if index in failed:
+                results.append(request)
+                continue
+            results.append(request.model_copy(update={"status": new_status, "updated_at": now}))
+            if user_op is not None:
+                user_ops.append(user_op)
+                affected_users.add(request.user_id)
+
+        # Ordenado: varias solicitudes del mismo usuario y tipo se aplican en el orden recibido
+        await self.user_repository.bulk_write(user_ops, ordered=True)
+        for user_id in affected_users:
+            invalidate_cached_user(user_id)
+        return results, not_found
 
     async def delete_request(self, request_id: str) -> Dict[str, str]:
         """
         Elimina una solicitud por su ID.
         """
-        request_to_delete = await self.request_repository.get(request_id)
-        if not request_to_delete:
+        object_id = parse_object_id(request_id)
+        if object_id is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Solicitud no encontrada.")
+
+        # Eliminar y obtener el documento eliminado en una sola operación; con MONGODB_TRANSACTIONS
+        # la eliminación y la liberación del slot se confirman juntas
+        now = datetime.now(timezone.utc)
+        slot_released = False
+        async with transaction() as session:
+            request_to_delete = await self.request_repository.find_one_and_delete({"_id": object_id}, session=session)
+            if not request_to_delete:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Solicitud no encontrada.")
             
-        deleted = await self.request_repository.delete(request_id)
-        if not deleted:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="No se pudo eliminar la solicitud.")
-        
-        # Liberar el slot del usuario si la solicitud estaba aceptada
-        if request_to_delete.status == "accepted":
-            user = await self.user_repository.get(request_to_delete.user_id)
-            if user:
-                vehicle_type = request_to_delete.vehicle_type
-                user_vehicle_slots = user.vehicle_slots.copy()
-                
-                if user_vehicle_slots.get(vehicle_type, {}).get("request_id") == str(request_to_delete.id):
-                    user_vehicle_slots[vehicle_type] = {
-                        "available": True,
-                        "request_id": None
-                    }
-                    
-                    await self.user_repository.update(
-                        str(user.id), 
-                        {"vehicle_slots": user_vehicle_slots, "updated_at": datetime.utcnow()}
+            # Liberar el slot del usuario si la solicitud estaba aceptada
+            if request_to_delete.status == "accepted":
+                slot_update = _slot_update(request_to_delete, "deleted")
+                if slot_update:
+                    user_filter, slot_data = slot_update
+                    slot_released = await self.user_repository.update_one(
+                        user_filter, {**slot_data, "updated_at": now}, session=session
                     )
+        invalidate_request_lists()
+        if slot_released:
+            invalidate_cached_user(request_to_delete.user_id)
         
         return {"message": "Solicitud eliminada exitosamente."}
\ No newline at end of file
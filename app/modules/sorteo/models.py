@@ -1,6 +1,6 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional, Literal, List
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 # Esquema anidado para los ganadores y no ganadores dentro del resultado del sorteo
 class LotteryParticipantResult(BaseModel):
@@ -42,11 +42,11 @@ class LotteryResult(BaseModel):
         description="Lista de usuarios que participaron pero no ganaron un spot de parqueo en este sorteo."
     )
     
-    executed_at: datetime = Field(default_factory=datetime.utcnow, description="Fecha y hora en que se ejecutó el sorteo.")
+    executed_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), description="Fecha y hora en que se ejecutó el sorteo.")
 
-    class Config:
-        populate_by_name = True # Permite que los campos se mapeen por su alias (_id)
-        json_schema_extra = {
+    model_config = ConfigDict(
+        populate_by_name=True, # Permite que los campos se mapeen por su alias (_id)
+        json_schema_extra={
             "example": {
                 "period": "2025-07",
                 "total_car_spots_offered": 10,
@@ -77,4 +77,21 @@ class LotteryResult(BaseModel):
                 ],
                 "executed_at": "2025-06-30T10:00:00Z"
             }
-        }
\ No newline at end of file
+        },
+    )
+
+class LotteryJob(BaseModel):
+    """
+    Modelo de datos para una ejecución de sorteo en segundo plano.
+    Representa un documento en la colección 'lottery_jobs'.
+    """
+    id: Optional[str] = Field(None, alias="_id")
+    period: str = Field(..., description="Período del sorteo en formato YYYY-MM")
+    status: Literal["running", "done", "failed"] = Field("running", description="Estado de la ejecución")
+    lottery_id: Optional[str] = Field(None, description="ID del resultado del sorteo (cuando termina)")
+    error: Optional[str] = Field(None, description="Motivo del fallo (si falló)")
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: Optional[datetime] = Field(None, description="Inicio del sorteo en el worker")
+    finished_at: Optional[datetime] = None
+
+    model_config = ConfigDict(populate_by_name=True)
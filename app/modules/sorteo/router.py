@@ -1,20 +1,29 @@
 from typing import Annotated, List, Optional, Literal # Asegúrate de importar Literal
-from fastapi import APIRouter, Depends, HTTPException, Response, status, Query
-from motor.motor_asyncio import AsyncIOMotorDatabase
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Path, Request, Response, status, Query
+from fastapi.responses import StreamingResponse
+import orjson
+from pymongo.asynchronous.database import AsyncDatabase
 
 from app.database.mongodb import get_database
 from app.modules.sorteo.service import LotteryService
-from app.modules.sorteo.schemas import LotteryCreate, LotteryResultOut, MyAssignmentOut
+from app.modules.sorteo.schemas import LotteryCreate, LotteryJobAcceptedOut, LotteryJobOut, LotteryResultOut, MyAssignmentOut
 from app.modules.residentes.models import User
-from app.core.dependencies import get_current_active_admin_user, get_current_active_user
+from app.core.dependencies import require_admin, get_current_active_user
+from app.shared.responses import item_response
 
 router = APIRouter(prefix="/lottery", tags=["Lottery"])
 
-@router.post("/execute", response_model=LotteryResultOut, status_code=status.HTTP_201_CREATED)
+# Período de sorteo en la ruta (YYYY-MM). FastAPI compila el validador una sola vez y un valor
+# mal formado responde 422 sin llegar a MongoDB.
+LotteryPeriod = Annotated[str, Path(pattern=r"^\d{4}-\d{2}$", description="Período del sorteo en formato YYYY-MM (ej. '2025-07').")]
+
+@router.post("/execute", response_model=LotteryJobAcceptedOut, status_code=status.HTTP_202_ACCEPTED)
 async def execute_lottery_endpoint(
     lottery_data: LotteryCreate,
-    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
-    current_admin: Annotated[User, Depends(get_current_active_admin_user)] # Solo administradores pueden ejecutar el sorteo
+    background_tasks: BackgroundTasks,
+    request: Request,
+    db: Annotated[AsyncDatabase, Depends(get_database)],
+    current_admin: Annotated[User, Depends(require_admin)] # Solo administradores pueden ejecutar el sorteo
 ):
     """
     ## Ejecutar el Sorteo de Parqueo
@@ -26,17 +35,38 @@ async def execute_lottery_endpoint(
     - **num_car_spots**: Cantidad de espacios disponibles para automóviles.
     - **num_moto_spots**: Cantidad de espacios disponibles para motocicletas.
     
-    Retorna el resultado detallado del sorteo, incluyendo ganadores y no ganadores.
+    El sorteo se ejecuta en segundo plano: responde `202 Accepted` con el `job_id` y la
+    `status_url` para consultar su estado en `GET /lottery/jobs/{job_id}`. Al terminar,
+    el resultado se consulta en `GET /lottery/{period}`.
+    """
+    lottery_service = LotteryService(db)
+    job = await lottery_service.start_lottery_job(lottery_data)
+    background_tasks.add_task(lottery_service.run_lottery_job, job.id, lottery_data)
+    return {"job_id": job.id, "status_url": str(request.url_for("get_lottery_job", job_id=job.id))}
+
+@router.get("/jobs/{job_id}", response_model=LotteryJobOut)
+async def get_lottery_job(
+    job_id: str,
+    db: Annotated[AsyncDatabase, Depends(get_database)],
+    current_admin: Annotated[User, Depends(require_admin)]
+):
+    """
+    ## Estado de una Ejecución de Sorteo
+    
+    Permite a un **administrador** consultar una ejecución iniciada con `POST /lottery/execute`:
+    `running` mientras se ejecuta, `done` con el `lottery_id` del resultado (los correos se envían
+    después), o `failed` con el motivo en `error`. Una ejecución que lleva más de `LOTTERY_JOB_TIMEOUT`
+    segundos en `running` (ej. reinicio del servidor) se reporta como `failed`.
     """
     lottery_service = LotteryService(db)
-    result = await lottery_service.execute_lottery(lottery_data)
-    return result
+    job = await lottery_service.get_lottery_job(job_id)
+    return item_response(job, LotteryJobOut)
 
 @router.get("/{lottery_period}", response_model=LotteryResultOut)
 async def get_lottery_results_by_period(
-    lottery_period: str,
-    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
-    current_admin: Annotated[User, Depends(get_current_active_admin_user)], # Solo administradores pueden ver los resultados completos
+    lottery_period: LotteryPeriod,
+    db: Annotated[AsyncDatabase, Depends(get_database)],
+    current_admin: Annotated[User, Depends(require_admin)], # Solo administradores pueden ver los resultados completos
     # Nuevo parámetro de consulta para filtrar por tipo de vehículo
     vehicle_type: Optional[Literal["automovil", "motocicleta"]] = Query(
         None, 
@@ -58,12 +88,45 @@ async def get_lottery_results_by_period(
     # Pasa el parámetro de filtro directamente al servicio
     result = await lottery_service.get_lottery_result(lottery_period, vehicle_type=vehicle_type) 
     
-    return result
+    return item_response(result, LotteryResultOut)
+
+@router.get("/{lottery_period}/stream")
+async def stream_lottery_winners(
+    lottery_period: LotteryPeriod,
+    db: Annotated[AsyncDatabase, Depends(get_database)],
+    current_admin: Annotated[User, Depends(require_admin)], # Solo administradores pueden ver los resultados completos
+    vehicle_type: Optional[Literal["automovil", "motocicleta"]] = Query(
+        None,
+        description="Filtrar los ganadores por tipo de vehículo (automovil o motocicleta)."
+    )
+):
+    """
+    ## Ganadores de un Sorteo en Streaming
+    
+    Variante de `GET /lottery/{lottery_period}` para sorteos grandes: responde
+    `{"period": ..., "winners": [...]}` enviando los ganadores a medida que llegan del cursor
+    de MongoDB, sin construir el resultado completo en memoria.
+    
+    Requiere permisos de administrador.
+    """
+    lottery_service = LotteryService(db)
+    if not await lottery_service.lottery_exists(lottery_period):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Resultado de sorteo no encontrado para el período especificado.")
+
+    async def body():
+        yield b'{"period":' + orjson.dumps(lottery_period) + b',"winners":['
+        separator = b""
+        async for winner in lottery_service.stream_winners(lottery_period, vehicle_type=vehicle_type):
+            yield separator + orjson.dumps(winner)
+            separator = b","
+        yield b"]}"
+
+    return StreamingResponse(body(), media_type="application/json")
 
 @router.get("/my-assignment/{lottery_period}", response_model=List[MyAssignmentOut])
 async def get_my_lottery_assignment(
-    lottery_period: str,
-    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
+    lottery_period: LotteryPeriod,
+    db: Annotated[AsyncDatabase, Depends(get_database)],
     current_user: Annotated[User, Depends(get_current_active_user)] # Cualquier usuario activo puede ver su asignación
 ):
     """
@@ -87,9 +150,9 @@ async def get_my_lottery_assignment(
 
 @router.delete("/{lottery_period}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_lottery_results(
-    lottery_period: str,
-    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
-    current_admin: Annotated[User, Depends(get_current_active_admin_user)] # Solo administradores pueden borrar sorteos
+    lottery_period: LotteryPeriod,
+    db: Annotated[AsyncDatabase, Depends(get_database)],
+    current_admin: Annotated[User, Depends(require_admin)] # Solo administradores pueden borrar sorteos
 ):
     """
     ## Eliminar un Sorteo por Período
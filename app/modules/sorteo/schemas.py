@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import Optional, Literal, List
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field
 
 # --- Esquemas de Entrada (Input Schemas) ---
 
@@ -28,14 +28,15 @@ class LotteryCreate(BaseModel):
         description="Número de espacios de parqueo para motocicletas disponibles para el sorteo."
     )
 
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "period": "2025-07",
                 "num_car_spots": 10,
                 "num_moto_spots": 5
             }
-        }
+        },
+    )
 
 # --- Esquemas de Salida (Output Schemas) ---
 
@@ -56,25 +57,17 @@ class LotteryResultOut(BaseModel):
     """
     Esquema para la salida completa del resultado de un sorteo.
     """
-    id: Optional[str] = Field(None, examples=["666c8a7f7b1e3e4d5f6a2b1f"])
+    id: Optional[str] = Field(None, examples=["666c8a7f7b1e3e4d5f6a2b1f"]) # BaseRepository ya entrega el '_id' convertido a string
     period: str
     total_car_spots_offered: int
     total_moto_spots_offered: int
     winners: List[LotteryAssignmentOut]
     non_winners: List[LotteryAssignmentOut]
     executed_at: datetime
-
-    @field_validator("id", mode="before")
-    def convert_objectid_to_str(cls, v):
-        """Convierte ObjectId a str para asegurar la compatibilidad con Pydantic."""
-        return str(v) if v is not None else None
     
-    class Config:
-        populate_by_name = True
-        json_encoders = {
-            datetime: lambda dt: dt.isoformat() # Asegura que datetime se serialice correctamente a ISO format
-        }
-        json_schema_extra = {
+    model_config = ConfigDict(
+        populate_by_name=True,
+        json_schema_extra={
             "example": {
                 "id": "666c8a7f7b1e3e4d5f6a2b1f",
                 "period": "2025-07",
@@ -106,7 +99,8 @@ class LotteryResultOut(BaseModel):
                 ],
                 "executed_at": "2025-06-30T10:00:00Z"
             }
-        }
+        },
+    )
 
 
 class MyAssignmentOut(BaseModel):
@@ -118,12 +112,34 @@ class MyAssignmentOut(BaseModel):
     license_plate: str
     spot: Optional[str] = Field(None, description="Identificador del spot de parqueo asignado")
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "period": "2025-07",
                 "vehicle_type": "automovil",
                 "license_plate": "XYZ789",
                 "spot": "P1-A01"
             }
-        }
\ No newline at end of file
+        },
+    )
+
+class LotteryJobAcceptedOut(BaseModel):
+    """
+    Respuesta al encolar la ejecución de un sorteo.
+    """
+    job_id: str
+    status_url: str = Field(..., description="URL para consultar el estado de la ejecución")
+
+
+class LotteryJobOut(BaseModel):
+    """
+    Esquema para el estado de una ejecución de sorteo en segundo plano.
+    """
+    id: str
+    period: str
+    status: Literal["running", "done", "failed"]
+    lottery_id: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
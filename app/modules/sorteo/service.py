@@ -1,186 +1,330 @@
-import os
+import asyncio
+import heapq
+import logging
 import random
-from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any, Literal # Asegúrate de importar Literal
+from itertools import islice
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, FrozenSet, List, Optional, Dict, Any, Literal, Tuple # Asegúrate de importar Literal
+from cachetools import TTLCache
 from fastapi import HTTPException, status
-from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.asynchronous.client_session import AsyncClientSession
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import DuplicateKeyError
 
-import resend
-
-from app.modules.sorteo.models import LotteryResult, LotteryParticipantResult
+from app.core.config import get_settings, settings
+from app.modules.sorteo.models import LotteryJob, LotteryResult, LotteryParticipantResult
 from app.modules.sorteo.schemas import LotteryCreate, MyAssignmentOut
 from app.modules.solicitudes.models import Request
 from app.modules.residentes.models import User
-from app.shared.repository import BaseRepository
+from app.shared.repository import get_repository, parse_object_id
+from app.database.mongodb import transaction
+
 
+logger = logging.getLogger("parknet")
 
-RESEND_KEY = os.getenv('RESEND_KEY')
+RESEND_KEY = get_settings().RESEND_KEY
 if not RESEND_KEY:
     raise RuntimeError("La variable de entorno RESEND_KEY no está configurada.")
-resend.api_key = RESEND_KEY
+
+
+def _get_resend():
+    """
+    Importa y configura el SDK de Resend en el primer envío de correos.
+    El SDK arrastra 'requests' y sus dependencias, que así no se cargan al iniciar cada worker.
+    """
+    import resend
+    resend.api_key = RESEND_KEY
+    return resend
+
+
+# Caché de resultados de sorteo por (período, tipo de vehículo). Justo después de ejecutar un
+# sorteo muchos usuarios consultan el mismo período: las lecturas concurrentes de una misma
+# clave comparten una sola consulta (_lottery_inflight) y el resultado se reutiliza durante
+# LOTTERY_RESULT_CACHE_TTL segundos. Solo se accede desde el event loop, así que no usa Lock.
+_lottery_result_cache: Optional[TTLCache] = (
+    TTLCache(maxsize=128, ttl=settings.LOTTERY_RESULT_CACHE_TTL) if settings.LOTTERY_RESULT_CACHE_TTL > 0 else None
+)
+_lottery_inflight: Dict[Tuple[str, Optional[str]], "asyncio.Future[Optional[LotteryResult]]"] = {}
+# No ganadores de cada período (user_ids), para la prioridad del sorteo del período siguiente
+_previous_non_winners_cache: Optional[TTLCache] = (
+    TTLCache(maxsize=64, ttl=settings.LOTTERY_RESULT_CACHE_TTL) if settings.LOTTERY_RESULT_CACHE_TTL > 0 else None
+)
+# Se incrementa en cada invalidación: una consulta que empezó antes no guarda su resultado
+_lottery_cache_generation = 0
+
+def invalidate_lottery_results() -> None:
+    """
+    Vacía las cachés de resultados de sorteo. Debe llamarse después de crear o eliminar un sorteo.
+    """
+    global _lottery_cache_generation
+    _lottery_cache_generation += 1
+    if _lottery_result_cache is not None:
+        _lottery_result_cache.clear()
+    if _previous_non_winners_cache is not None:
+        _previous_non_winners_cache.clear()
+
+
+# Une cada solicitud con su residente ('user_id' se guarda como string) y deja solo los campos
+# que usan la puntuación y LotteryParticipantResult
+PARTICIPANT_LOOKUP_STAGES: List[Dict[str, Any]] = [
+    {"$project": {"user_id": 1, "vehicle_type": 1, "license_plate": 1, "disability": 1, "pay": 1}},
+    {"$lookup": {
+        "from": "users",
+        "let": {"user_object_id": {"$convert": {"input": "$user_id", "to": "objectId", "onError": None, "onNull": None}}},
+        "pipeline": [
+            {"$match": {"$expr": {"$eq": ["$_id", "$$user_object_id"]}}},
+            {"$project": {"_id": 0, "cc": 1, "full_name": 1, "apartment": 1}},
+        ],
+        "as": "user",
+    }},
+    {"$unwind": "$user"},
+    {"$project": {
+        # IDs como string desde MongoDB: el sorteo no convierte ningún ID en Python
+        "_id": 0,
+        "id": {"$toString": "$_id"},
+        "user_id": 1,
+        "vehicle_type": 1,
+        "license_plate": 1,
+        "disability": 1,
+        "pay": 1,
+        "cc": "$user.cc",
+        "full_name": "$user.full_name",
+        "apartment": "$user.apartment",
+    }},
+]
+
+
+def _participant_result(participant: Dict[str, Any], spot: Optional[str]) -> LotteryParticipantResult:
+    """
+    Construye el resultado de un participante del sorteo a partir de su fila de PARTICIPANT_LOOKUP_STAGES.
+    """
+    return LotteryParticipantResult(
+        user_id=participant["user_id"],
+        cc=participant["cc"],
+        full_name=participant["full_name"],
+        apartment=participant["apartment"],
+        vehicle_type=participant["vehicle_type"],
+        license_plate=participant["license_plate"],
+        spot=spot,
+        request_id=participant["id"],
+    )
+
+
+# Remitente de los correos del sorteo y máximo de correos por petición a la API de lotes de Resend
+LOTTERY_EMAIL_SENDER = "Park-Net Notificaciones <onboarding@resend.dev>"
+RESEND_BATCH_SIZE = 100
+
+# Cuerpos HTML de los correos del sorteo; se completan con los campos de
+# LotteryParticipantResult más 'period' (str.format_map)
+WINNER_EMAIL_TEMPLATE = """
+            <html>
+            <body>
+                <h1>¡Felicidades, {full_name}!</h1>
+                <p>Has ganado un espacio de parqueo para tu {vehicle_type}
+                (placa {license_plate}) en el período {period}.</p>
+                <p>Tu spot asignado es: <strong>{spot}</strong>.</p>
+                <p>Por favor, respeta las normas del condominio.</p>
+            </body>
+            </html>
+            """
+
+NON_WINNER_EMAIL_TEMPLATE = """
+                <html>
+                <body>
+                    <h1>Resultado Sorteo – {full_name}</h1>
+                    <p>Lamentablemente no obtuviste un spot para tu {vehicle_type}
+                    (placa {license_plate}) en el período {period}.</p>
+                    <p>¡Tendrás prioridad en el próximo sorteo!</p>
+                </body>
+                </html>
+                """
+
 
 class LotteryService:
     """
     Servicio de lógica de negocio para la gestión de sorteos de parqueo.
     """
-    def __init__(self, db: AsyncIOMotorDatabase):
+    def __init__(self, db: AsyncDatabase):
         self.db = db
-        self.lottery_repository = BaseRepository(self.db["lotteries"], LotteryResult)
-        self.request_repository = BaseRepository(self.db["requests"], Request)
-        self.user_repository = BaseRepository(self.db["users"], User)  # Para consultar usuarios
+        self.lottery_repository = get_repository(self.db, "lotteries", LotteryResult)
+        self.request_repository = get_repository(self.db, "requests", Request)
+        self.user_repository = get_repository(self.db, "users", User)  # Para consultar usuarios
+        self.job_repository = get_repository(self.db, "lottery_jobs", LotteryJob)
 
-    async def _get_previous_period_non_winners(self, current_period: str) -> List[str]:
+    async def _get_previous_period_non_winners(
+        self,
+        current_period: str,
+        session: Optional[AsyncClientSession] = None
+    ) -> FrozenSet[str]:
         """
         Método auxiliar para obtener los user_id de los no ganadores del período anterior.
         El formato de período es 'YYYY-MM'.
         """
-        year, month = map(int, current_period.split('-'))
+        year, month = int(current_period[:4]), int(current_period[5:7])
         
-        # Calcular el período anterior
-        if month == 1:
-            prev_month = 12
-            prev_year = year - 1
-        else:
-            prev_month = month - 1
-            prev_year = year
+        # Calcular el período anterior: meses desde el año 0 (base 0), menos uno
+        prev_year, prev_month_index = divmod(year * 12 + month - 2, 12)
+        previous_period = f"{prev_year:04d}-{prev_month_index + 1:02d}"
         
-        previous_period = f"{prev_year:04d}-{prev_month:02d}"
-        
-        previous_lottery = await self.lottery_repository.find_one({"period": previous_period})
+        if _previous_non_winners_cache is not None:
+            cached = _previous_non_winners_cache.get(previous_period)
+            if cached is not None:
+                return cached
+        generation = _lottery_cache_generation
+
+        # Solo se leen los user_id de los no ganadores, sin validar el sorteo completo con el modelo
+        previous_lotteries = await self.lottery_repository.find_many_raw(
+            {"period": previous_period},
+            {"_id": 0, "non_winners.user_id": 1},
+            limit=1,
+            session=session
+        )
         
-        if previous_lottery and previous_lottery.non_winners:
-            # Retorna una lista de user_ids de los no ganadores del periodo anterior
-            return [p.user_id for p in previous_lottery.non_winners]
-        return []
+        # Conjunto de user_ids de los no ganadores del periodo anterior (vacío si no hubo sorteo)
+        non_winners = frozenset(
+            p["user_id"] for p in (previous_lotteries[0].get("non_winners", []) if previous_lotteries else [])
+        )
+        if _previous_non_winners_cache is not None and generation == _lottery_cache_generation:
+            _previous_non_winners_cache[previous_period] = non_winners
+        return non_winners
 
-    async def _generate_spots(self, num_car_spots: int, num_moto_spots: int) -> Dict[str, List[str]]:
+    def _generate_spots(self, num_car_spots: int, num_moto_spots: int) -> Dict[str, List[str]]:
         """
-        Genera una lista de identificadores de spots de parqueo simulados.
-        Ej: C-01, C-02... M-01, M-02...
+        Genera las listas de identificadores de spots de parqueo simulados, por tipo de vehículo.
+        Ej: C-01, C-02... M-01, M-02... (se asignan en ese orden)
         """
         car_spots = [f"C-{i+1:02d}" for i in range(num_car_spots)]
         moto_spots = [f"M-{i+1:02d}" for i in range(num_moto_spots)]
         return {"automovil": car_spots, "motocicleta": moto_spots}
 
-    async def execute_lottery(self, lottery_data: LotteryCreate) -> LotteryResult:
+    async def _save_lottery_result(
+        self,
+        lottery_result: LotteryResult,
+        session: Optional[AsyncClientSession] = None
+    ) -> LotteryResult:
         """
-        Ejecuta el sorteo de parqueo para un período dado.
+        Guarda el resultado de un sorteo. Si el período ya tiene sorteo, el índice único
+        de 'period' rechaza la inserción y se responde 409.
         """
-        existing_lottery = await self.lottery_repository.find_one({"period": lottery_data.period})
-        if existing_lottery:
+        try:
+            return await self.lottery_repository.create(lottery_result, session=session)
+        except DuplicateKeyError:
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
-                detail=f"Ya se ha ejecutado un sorteo para el período {lottery_data.period}. ID: {existing_lottery.id}"
+                detail=f"Ya se ha ejecutado un sorteo para el período {lottery_result.period}."
             )
-        
-        accepted_requests = await self.request_repository.find_many(
-            {"lottery_period": lottery_data.period, "status": "accepted"},
-            limit=1000
-        )
 
-        if not accepted_requests:
+    async def execute_lottery(self, lottery_data: LotteryCreate) -> LotteryResult:
+        """
+        Ejecuta el sorteo de parqueo para un período dado.
+        Un período ya sorteado se detecta al guardar, por el índice único de 'period' (409).
+        Las lecturas y el guardado del resultado van en una transacción (si MONGODB_TRANSACTIONS
+        está activo): el sorteo usa una vista consistente de solicitudes, residentes y sorteo anterior.
+        Los correos se envían después de confirmar la transacción.
+        """
+        created_lottery = await self._draw_and_save_lottery(lottery_data)
+        await self._notify_lottery_result(created_lottery)
+        return created_lottery
+
+    async def _draw_and_save_lottery(self, lottery_data: LotteryCreate) -> LotteryResult:
+        """
+        Realiza y guarda el sorteo (en una transacción si MONGODB_TRANSACTIONS está activo), sin notificar.
+        """
+        async with transaction() as session:
+            created_lottery = await self._draw_lottery(lottery_data, session)
+        invalidate_lottery_results()
+        return created_lottery
+
+    async def _notify_lottery_result(self, created_lottery: LotteryResult) -> None:
+        """
+        Envía los correos de un sorteo ya guardado. Un fallo al notificar se registra
+        pero no se propaga: el sorteo ya existe y no debe reportarse como fallido.
+        """
+        if not (created_lottery.winners or created_lottery.non_winners):
+            return
+        try:
+            await self._send_lottery_notifications(created_lottery, notify_non_winners=True)
+        except Exception:
+            logger.exception("Error al enviar las notificaciones del sorteo %s", created_lottery.period)
+
+    async def _draw_lottery(
+        self,
+        lottery_data: LotteryCreate,
+        session: Optional[AsyncClientSession] = None
+    ) -> LotteryResult:
+        """
+        Lee los participantes, realiza el sorteo y guarda el resultado (sin notificar).
+        """
+        previous_non_winners_set = await self._get_previous_period_non_winners(lottery_data.period, session)
+
+        # Solicitudes aceptadas con los datos de su residente en una sola consulta (sin un get por usuario).
+        # Las solicitudes cuyo usuario ya no existe quedan fuera del sorteo. Cada participante se puntúa
+        # a medida que llega del cursor, sin esperar a tener la lista completa.
+        # (-puntaje, desempate aleatorio, posición, participante): al comparar las tuplas gana el mayor
+        # puntaje y, entre empatados, el orden es aleatorio. La posición evita comparar los dicts.
+        scored_participants = []
+        position = 0
+        async for participant in self.request_repository.iter_aggregate([
+            {"$match": {"lottery_period": lottery_data.period, "status": "accepted"}},
+            {"$limit": 1000},
+            *PARTICIPANT_LOOKUP_STAGES,
+        ], session=session):
+            priority_score = (
+                1000 * bool(participant.get("disability"))
+                + 500 * (participant["user_id"] in previous_non_winners_set)
+                + 100 * bool(participant.get("pay"))
+            )
+            scored_participants.append((-priority_score, random.random(), position, participant))
+            position += 1
+
+        if not scored_participants:
             new_lottery_result = LotteryResult(
                 period=lottery_data.period,
                 total_car_spots_offered=lottery_data.num_car_spots,
                 total_moto_spots_offered=lottery_data.num_moto_spots,
                 winners=[],
                 non_winners=[],
-                executed_at=datetime.utcnow()
+                executed_at=datetime.now(timezone.utc)
             ) # type: ignore
-            created_lottery = await self.lottery_repository.create(new_lottery_result)
-            return created_lottery
-
-        previous_non_winners_ids = await self._get_previous_period_non_winners(lottery_data.period)
-        requests_with_user_info = []
-        user_cache: Dict[str, User] = {}
-
-        for req in accepted_requests:
-            if str(req.user_id) not in user_cache:
-                user_obj = await self.user_repository.get(str(req.user_id))
-                if not user_obj:
-                    print(f"Advertencia: Usuario con ID {req.user_id} no encontrado para la solicitud {req.id}")
-                    continue
-                user_cache[str(req.user_id)] = user_obj
-            user = user_cache[str(req.user_id)]
-            requests_with_user_info.append({
-                "request": req,
-                "user": user,
-                "priority_score": 0
-            })
-        
-        for item in requests_with_user_info:
-            req = item["request"]
-            user = item["user"]
-            if req.disability:
-                item["priority_score"] += 1000
-            if str(user.id) in previous_non_winners_ids:
-                item["priority_score"] += 500
-            if req.pay:
-                item["priority_score"] += 100
-        
-        requests_with_user_info.sort(key=lambda x: x["priority_score"], reverse=True)
-        from itertools import groupby
-        grouped_requests = []
-        for score, group in groupby(requests_with_user_info, key=lambda x: x["priority_score"]):
-            group_list = list(group)
-            random.shuffle(group_list)
-            grouped_requests.extend(group_list)
-        final_sorted_requests = grouped_requests
-
-        available_spots = await self._generate_spots(lottery_data.num_car_spots, lottery_data.num_moto_spots)
-        car_spots = available_spots["automovil"]
-        moto_spots = available_spots["motocicleta"]
-        
-        winners: List[LotteryParticipantResult] = []
-        non_winners: List[LotteryParticipantResult] = []
-        assigned_users_and_vehicle_types = set()
-
-        for item in final_sorted_requests:
-            req = item["request"]
-            user = item["user"]
-            assignment_key = f"{str(user.id)}_{req.vehicle_type}"
-            if assignment_key in assigned_users_and_vehicle_types:
-                non_winners.append(LotteryParticipantResult(
-                    user_id=str(user.id),
-                    cc=user.cc,
-                    full_name=user.full_name,
-                    apartment=user.apartment,
-                    vehicle_type=req.vehicle_type,
-                    license_plate=req.license_plate,
-                    spot=None,
-                    request_id=str(req.id)
-                ))
-                continue
-
-            spot_assigned = None
-            if req.vehicle_type == "automovil" and car_spots:
-                spot_assigned = car_spots.pop(0)
-            elif req.vehicle_type == "motocicleta" and moto_spots:
-                spot_assigned = moto_spots.pop(0)
-            
-            if spot_assigned:
-                winners.append(LotteryParticipantResult(
-                    user_id=str(user.id),
-                    cc=user.cc,
-                    full_name=user.full_name,
-                    apartment=user.apartment,
-                    vehicle_type=req.vehicle_type,
-                    license_plate=req.license_plate,
-                    spot=spot_assigned,
-                    request_id=str(req.id)
-                ))
-                assigned_users_and_vehicle_types.add(assignment_key)
-            else:
-                non_winners.append(LotteryParticipantResult(
-                    user_id=str(user.id),
-                    cc=user.cc,
-                    full_name=user.full_name,
-                    apartment=user.apartment,
-                    vehicle_type=req.vehicle_type,
-                    license_plate=req.license_plate,
-                    spot=None,
-                    request_id=str(req.id)
-                ))
+            return await self._save_lottery_result(new_lottery_result, session)
+
+
+        available_spots = self._generate_spots(lottery_data.num_car_spots, lottery_data.num_moto_spots)
+
+        # Candidatos a spot por tipo de vehículo: solo la mejor solicitud de cada usuario para cada
+        # tipo (las demás quedan como no ganadoras)
+        best_by_user_and_vehicle_type: Dict[Tuple[str, str], tuple] = {}
+        for entry in scored_participants:
+            participant = entry[3]
+            assignment_key = (participant["user_id"], participant["vehicle_type"])
+            current = best_by_user_and_vehicle_type.get(assignment_key)
+            if current is None or entry < current:
+                best_by_user_and_vehicle_type[assignment_key] = entry
+        candidates: Dict[str, List[tuple]] = {vehicle_type: [] for vehicle_type in available_spots}
+        for entry in best_by_user_and_vehicle_type.values():
+            candidates[entry[3]["vehicle_type"]].append(entry)
+
+        # Solo hacen falta los K mejores candidatos de cada tipo (K = spots del tipo): selección con
+        # heapq.nsmallest en lugar de ordenar a todos. Reciben los spots en orden de prioridad.
+        winner_entries = []
+        spot_by_position: Dict[int, str] = {}
+        for vehicle_type, spots in available_spots.items():
+            top_candidates = heapq.nsmallest(len(spots), candidates[vehicle_type])
+            for entry, spot in zip(top_candidates, spots):
+                spot_by_position[entry[2]] = spot
+            winner_entries.extend(top_candidates)
+        winner_entries.sort()
+
+        winners = [
+            _participant_result(participant, spot_by_position[position])
+            for _, _, position, participant in winner_entries
+        ]
+        # No ganadores en el orden en que llegaron del cursor
+        non_winners = [
+            _participant_result(participant, None)
+            for _, _, position, participant in scored_participants
+            if position not in spot_by_position
+        ]
         
         new_lottery_result = LotteryResult(
             period=lottery_data.period,
@@ -188,13 +332,81 @@ class LotteryService:
             total_moto_spots_offered=lottery_data.num_moto_spots,
             winners=winners,
             non_winners=non_winners,
-            executed_at=datetime.utcnow()
+            executed_at=datetime.now(timezone.utc)
         ) # type: ignore
         
-        created_lottery = await self.lottery_repository.create(new_lottery_result)
-        await self._send_lottery_notifications(created_lottery, notify_non_winners=True)
+        return await self._save_lottery_result(new_lottery_result, session)
 
-        return created_lottery
+    async def start_lottery_job(self, lottery_data: LotteryCreate) -> LotteryJob:
+        """
+        Registra una ejecución de sorteo en segundo plano (estado 'running').
+        Rechaza de inmediato un período que ya tiene sorteo, antes de encolar el trabajo.
+        """
+        if await self.lottery_exists(lottery_data.period):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Ya se ha ejecutado un sorteo para el período {lottery_data.period}."
+            )
+        return await self.job_repository.create(LotteryJob(period=lottery_data.period)) # type: ignore
+
+    async def run_lottery_job(self, job_id: str, lottery_data: LotteryCreate) -> None:
+        """
+        Ejecuta el sorteo de una ejecución registrada con start_lottery_job y guarda su
+        estado final: 'done' con el ID del resultado, o 'failed' con el motivo.
+        El estado 'done' se guarda apenas se confirma el sorteo, antes de enviar los correos:
+        un fallo al notificar no deja la ejecución como fallida (el sorteo ya existe).
+        """
+        job_object_id = parse_object_id(job_id)
+        created_lottery = None
+        job_update: Dict[str, Any]
+        try:
+            await self.job_repository.update_one({"_id": job_object_id}, {"started_at": datetime.now(timezone.utc)})
+            created_lottery = await self._draw_and_save_lottery(lottery_data)
+            job_update = {"status": "done", "lottery_id": created_lottery.id}
+        except HTTPException as e:
+            job_update = {"status": "failed", "error": str(e.detail)}
+        except Exception as e:
+            logger.exception("Error ejecutando el sorteo %s: %s", job_id, e)
+            job_update = {"status": "failed", "error": "Error interno al ejecutar el sorteo."}
+        job_update["finished_at"] = datetime.now(timezone.utc)
+        try:
+            # Solo si sigue en 'running': get_lottery_job pudo marcarla como fallida por vencida
+            await self.job_repository.update_one({"_id": job_object_id, "status": "running"}, job_update)
+        except Exception:
+            # Si no se pudo guardar el estado, la regla de vencimiento de get_lottery_job la cierra
+            logger.exception("No se pudo guardar el estado final de la ejecución de sorteo %s", job_id)
+
+        if created_lottery is not None:
+            await self._notify_lottery_result(created_lottery)
+
+    async def get_lottery_job(self, job_id: str) -> LotteryJob:
+        """
+        Obtiene el estado de una ejecución de sorteo en segundo plano.
+        Una ejecución que sigue en 'running' más de LOTTERY_JOB_TIMEOUT segundos (ej. el worker
+        se reinició a mitad del sorteo) se marca como fallida para que los clientes dejen de esperar.
+        """
+        object_id = parse_object_id(job_id)
+        job = await self.job_repository.get(object_id) if object_id else None
+        if not job:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ejecución de sorteo no encontrada.")
+
+        if job.status == "running":
+            started_at = job.started_at or job.created_at
+            if started_at.tzinfo is None:
+                started_at = started_at.replace(tzinfo=timezone.utc) # MongoDB devuelve fechas UTC sin zona
+            now = datetime.now(timezone.utc)
+            if (now - started_at).total_seconds() > settings.LOTTERY_JOB_TIMEOUT:
+                stale_update = {
+                    "status": "failed",
+                    "error": "La ejecución del sorteo se interrumpió antes de terminar.",
+                    "finished_at": now,
+                }
+                # Condicionada a 'running': si la ejecución terminó entre la lectura y aquí, se conserva
+                if await self.job_repository.update_one({"_id": object_id, "status": "running"}, stale_update):
+                    job = job.model_copy(update=stale_update)
+                else:
+                    job = await self.job_repository.get(object_id) or job
+        return job
 
     async def get_lottery_result(
         self, 
@@ -203,17 +415,97 @@ class LotteryService:
     ) -> LotteryResult:
         """
         Obtiene los resultados de un sorteo por su período, opcionalmente filtrando a los ganadores por tipo de vehículo.
+        Usa la caché de resultados; las consultas concurrentes del mismo período esperan a la que ya está en curso.
         """
-        lottery_result = await self.lottery_repository.find_one({"period": lottery_period})
+        key = (lottery_period, vehicle_type)
+        lottery_result = _lottery_result_cache.get(key) if _lottery_result_cache is not None else None
+        if lottery_result is None:
+            inflight = _lottery_inflight.get(key)
+            if inflight is not None:
+                try:
+                    lottery_result = await asyncio.shield(inflight)
+                except asyncio.CancelledError:
+                    if not inflight.cancelled():
+                        raise
+                    # La consulta compartida se canceló (ej. su cliente se desconectó): consultar directamente
+                    lottery_result = await self._load_lottery_result(lottery_period, vehicle_type)
+            else:
+                inflight = asyncio.get_running_loop().create_future()
+                _lottery_inflight[key] = inflight
+                generation = _lottery_cache_generation
+                try:
+                    lottery_result = await self._load_lottery_result(lottery_period, vehicle_type)
+                    inflight.set_result(lottery_result)
+                except asyncio.CancelledError:
+                    inflight.cancel()
+                    raise
+                except Exception as err:
+                    inflight.set_exception(err)
+                    inflight.exception() # Marcar la excepción como consultada si nadie más esperaba
+                    raise
+                finally:
+                    _lottery_inflight.pop(key, None)
+                if (
+                    lottery_result is not None
+                    and _lottery_result_cache is not None
+                    and generation == _lottery_cache_generation
+                ):
+                    _lottery_result_cache[key] = lottery_result
+
         if not lottery_result:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Resultado de sorteo no encontrado para el período especificado.")
         
-        # Aplicar el filtro si se proporciona un vehicle_type
+        return lottery_result
+
+    async def _load_lottery_result(
+        self,
+        lottery_period: str,
+        vehicle_type: Optional[Literal["automovil", "motocicleta"]] = None
+    ) -> Optional[LotteryResult]:
+        """
+        Lee de MongoDB el resultado de un sorteo, con los ganadores filtrados por tipo de vehículo si se indica.
+        """
         if vehicle_type:
-            lottery_result.winners = [winner for winner in lottery_result.winners if winner.vehicle_type == vehicle_type]
+            # Filtrar los ganadores en MongoDB: solo viajan y se validan los del tipo pedido.
             # No es necesario filtrar non_winners, ya que la solicitud era para filtrar los GANADORES.
-        
-        return lottery_result
+            results = await self.lottery_repository.aggregate([
+                {"$match": {"period": lottery_period}},
+                {"$limit": 1},
+                {"$addFields": {"winners": {"$filter": {
+                    "input": "$winners",
+                    "as": "winner",
+                    "cond": {"$eq": ["$$winner.vehicle_type", vehicle_type]},
+                }}}},
+            ])
+            return results[0] if results else None
+        return await self.lottery_repository.find_one({"period": lottery_period})
+
+    async def lottery_exists(self, lottery_period: str) -> bool:
+        """
+        Indica si hay un sorteo para el período, sin leer el documento.
+        """
+        return await self.lottery_repository.count({"period": lottery_period}, limit=1) > 0
+
+    async def stream_winners(
+        self,
+        lottery_period: str,
+        vehicle_type: Optional[Literal["automovil", "motocicleta"]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Entrega los ganadores de un sorteo uno a uno desde el cursor de MongoDB ($unwind),
+        sin construir el resultado completo en memoria.
+        """
+        pipeline: List[Dict[str, Any]] = [
+            {"$match": {"period": lottery_period}},
+            {"$limit": 1},
+            {"$project": {"_id": 0, "winners": 1}},
+            {"$unwind": "$winners"},
+        ]
+        if vehicle_type:
+            pipeline.append({"$match": {"winners.vehicle_type": vehicle_type}})
+        pipeline.append({"$replaceRoot": {"newRoot": "$winners"}})
+        async for winner in self.lottery_repository.iter_aggregate(pipeline):
+            yield winner
 
     async def get_my_assignment(
         self,
@@ -224,19 +516,29 @@ class LotteryService:
         Consulta si un usuario específico tiene parqueadero asignado para un período dado.
         Retorna una lista de asignaciones (puede ser carro y moto).
         """
-        lottery_result = await self.lottery_repository.find_one({"period": lottery_period})
-        if not lottery_result:
-            return []  # Si no hay sorteo para el período, no hay asignaciones
-
-        my_assignments: List[MyAssignmentOut] = []
-        for winner in lottery_result.winners:
-            if winner.user_id == user_id:
-                my_assignments.append(MyAssignmentOut(
-                    period=lottery_period,
-                    vehicle_type=winner.vehicle_type,
-                    license_plate=winner.license_plate,
-                    spot=winner.spot,
-                ))
+        # Solo viajan las asignaciones del usuario, no el sorteo completo (ganadores y no ganadores).
+        # $filter recorre el arreglo dentro del documento; solo se desenrollan las coincidencias.
+        pipeline = [
+            {"$match": {"period": lottery_period, "winners.user_id": user_id}},
+            {"$project": {
+                "_id": 0,
+                "period": 1,
+                "matches": {"$filter": {
+                    "input": "$winners",
+                    "as": "winner",
+                    "cond": {"$eq": ["$$winner.user_id", user_id]},
+                }},
+            }},
+            {"$unwind": "$matches"},
+            {"$project": {
+                "period": 1,
+                "vehicle_type": "$matches.vehicle_type",
+                "license_plate": "$matches.license_plate",
+                "spot": "$matches.spot",
+            }},
+        ]
+        assignments = await self.lottery_repository.aggregate_raw(pipeline)
+        my_assignments: List[MyAssignmentOut] = [MyAssignmentOut(**assignment) for assignment in assignments]
         return my_assignments
 
 
@@ -266,6 +568,7 @@ class LotteryService:
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="No se pudo eliminar el sorteo a pesar de haberlo encontrado. Inténtalo de nuevo."
             )
+        invalidate_lottery_results()
         return {"message": "Sorteo eliminado exitosamente."}
 
     async def _send_lottery_notifications(
@@ -276,69 +579,77 @@ class LotteryService:
         """
         Envía notificaciones por correo a los ganadores y opcionalmente a los no ganadores
         usando Resend. Los ganadores reciben un correo personalizado con su spot asignado.
+        Los correos se envían con la API de lotes de Resend (hasta RESEND_BATCH_SIZE por petición).
         """
-        print(f"\n--- Preparando Notificaciones Sorteo Período {lottery_result.period} ---")
+        logger.info("Preparando notificaciones del sorteo del período %s", lottery_result.period)
+        resend = _get_resend()
+        period = lottery_result.period
+
+        participants = list(lottery_result.winners)
+        if notify_non_winners:
+            participants.extend(lottery_result.non_winners)
+
+        # Correos de todos los participantes en una sola consulta, en lugar de un get por participante
+        users = await self.user_repository.find_by_ids(
+            (participant.user_id for participant in participants),
+            {"email": 1}
+        )
+        email_map = {user["id"]: user.get("email") for user in users}
+
+        for participant in participants:
+            if not email_map.get(participant.user_id):
+                logger.warning("No se pudo enviar correo al usuario %s: email no disponible", participant.user_id)
 
-        def _send_email(to_email: str, subject: str, html_body: str):
-            params: resend.Emails.SendParams = {
-                "from": "Park-Net Notificaciones <onboarding@resend.dev>",
-                "to": [to_email],
-                "subject": subject,
-                "html": html_body
+        # Ganadores
+        winner_subject = f"¡Has ganado un spot! – Período {period}"
+        emails: List[Dict[str, Any]] = [
+            {
+                "from": LOTTERY_EMAIL_SENDER,
+                "to": [email_map[winner.user_id]],
+                "subject": winner_subject,
+                "html": WINNER_EMAIL_TEMPLATE.format_map(vars(winner) | {"period": period}),
             }
-            try:
-                result = resend.Emails.send(params)
-                msg_id = result.get("id", "—")
-                print(f"✅ Correo enviado a {to_email} (id={msg_id})")
-            except Exception as e:
-                print(f"❌ Error al enviar correo a {to_email}: {e}")
-
-        # Notificar a ganadores
-        for winner in lottery_result.winners:
-            user = await self.user_repository.get(winner.user_id)
-            if not user or not user.email:
-                print(f"⚠️ No se pudo enviar correo a {winner.full_name}: email no disponible.")
-                continue
-
-            html = f"""
-            <html>
-            <body>
-                <h1>¡Felicidades, {winner.full_name}!</h1>
-                <p>Has ganado un espacio de parqueo para tu {winner.vehicle_type}
-                (placa {winner.license_plate}) en el período {lottery_result.period}.</p>
-                <p>Tu spot asignado es: <strong>{winner.spot}</strong>.</p>
-                <p>Por favor, respeta las normas del condominio.</p>
-            </body>
-            </html>
-            """
-            _send_email(
-                to_email=user.email,
-                subject=f"¡Has ganado un spot! – Período {lottery_result.period}",
-                html_body=html
-            )
+            for winner in lottery_result.winners
+            if email_map.get(winner.user_id)
+        ]
 
-        # Notificar a no ganadores (opcional)
+        # No ganadores (opcional)
         if notify_non_winners:
-            for loser in lottery_result.non_winners:
-                user = await self.user_repository.get(loser.user_id)
-                if not user or not user.email:
-                    print(f"⚠️ No se pudo enviar correo a {loser.full_name}: email no disponible.")
-                    continue
+            non_winner_subject = f"Resultado Sorteo – Período {period}"
+            emails.extend(
+                {
+                    "from": LOTTERY_EMAIL_SENDER,
+                    "to": [email_map[loser.user_id]],
+                    "subject": non_winner_subject,
+                    "html": NON_WINNER_EMAIL_TEMPLATE.format_map(vars(loser) | {"period": period}),
+                }
+                for loser in lottery_result.non_winners
+                if email_map.get(loser.user_id)
+            )
 
-                html = f"""
-                <html>
-                <body>
-                    <h1>Resultado Sorteo – {loser.full_name}</h1>
-                    <p>Lamentablemente no obtuviste un spot para tu {loser.vehicle_type}
-                    (placa {loser.license_plate}) en el período {lottery_result.period}.</p>
-                    <p>¡Tendrás prioridad en el próximo sorteo!</p>
-                </body>
-                </html>
-                """
-                _send_email(
-                    to_email=user.email,
-                    subject=f"Resultado Sorteo – Período {lottery_result.period}",
-                    html_body=html
+        batches: List[List[Dict[str, Any]]] = []
+        email_iterator = iter(emails)
+        while batch := list(islice(email_iterator, RESEND_BATCH_SIZE)):
+            batches.append(batch)
+
+        send_semaphore = asyncio.Semaphore(max(settings.RESEND_MAX_CONCURRENCY, 1))
+
+        async def _send_batch(batch: List[Dict[str, Any]]) -> Any:
+            # El SDK de Resend es síncrono: el envío corre en un hilo para no bloquear el event loop
+            async with send_semaphore:
+                return await asyncio.to_thread(resend.Batch.send, batch)
+
+        # Hasta RESEND_MAX_CONCURRENCY lotes a la vez; un lote fallido no cancela los demás
+        results = await asyncio.gather(*(_send_batch(batch) for batch in batches), return_exceptions=True)
+        # Solo se registran conteos: las direcciones de los residentes no van a los logs
+        sent = 0
+        for index, (batch, result) in enumerate(zip(batches, results), start=1):
+            if isinstance(result, BaseException):
+                logger.error(
+                    "Error al enviar el lote %d/%d (%d correos) del sorteo %s",
+                    index, len(batches), len(batch), period, exc_info=result
                 )
+            else:
+                sent += len(batch)
 
-        print("--- Notificaciones Completadas ---")
\ No newline at end of file
+        logger.info("Notificaciones del sorteo %s: %d de %d correo(s) enviados", period, sent, len(emails))
\ No newline at end of file
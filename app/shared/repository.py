@@ -1,10 +1,15 @@
 from bson import ObjectId
-from typing import TypeVar, Generic, Type, Optional, List, Dict, Any
+from bson.errors import InvalidId
+from typing import TypeVar, Generic, Type, Optional, List, Dict, Any, Tuple, Union, AsyncIterator, Iterable
 from pydantic import BaseModel
-from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.asynchronous.client_session import AsyncClientSession
+from pymongo.asynchronous.collection import AsyncCollection
 from pymongo import ReturnDocument
 import pymongo
 import pymongo.errors
+import logging
+
+logger = logging.getLogger("parknet")
 
 # Define un TypeVar para el modelo Pydantic que usará el repositorio
 ModelType = TypeVar("ModelType", bound=BaseModel)
@@ -19,11 +24,11 @@ class BaseRepository(Generic[ModelType]):
     3. Garantiza consistencia en el manejo de IDs en toda la aplicación
     
     Atributos:
-        collection (AsyncIOMotorCollection): Colección de MongoDB
+        collection (AsyncCollection): Colección de MongoDB
         model (Type[ModelType]): Clase del modelo Pydantic para validación
     """
     
-    def __init__(self, collection: AsyncIOMotorCollection, model: Type[ModelType]):
+    def __init__(self, collection: AsyncCollection, model: Type[ModelType]):
         """
         Inicializa el repositorio con una colección de MongoDB y un modelo Pydantic.
         
@@ -33,16 +38,47 @@ class BaseRepository(Generic[ModelType]):
         """
         self.collection = collection
         self.model = model
+        # Proyección calculada una sola vez con los campos del modelo (por su alias en MongoDB):
+        # las lecturas que construyen el modelo no traen campos que el modelo descartaría
+        self._fields = tuple(field.alias or name for name, field in model.model_fields.items())
+        self._projection: Dict[str, Any] = {field: 1 for field in self._fields}
+
+    @staticmethod
+    def _to_document(obj_in: Union[BaseModel, Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Documento a insertar: el dict tal cual (copia superficial, insert_one le añade el '_id')
+        o el volcado del modelo Pydantic sin el campo 'id'.
+        """
+        if isinstance(obj_in, dict):
+            return {key: value for key, value in obj_in.items() if key != "id"}
+        return obj_in.model_dump(exclude={"id"})
+
+    def _construct(self, doc: Dict[str, Any]) -> ModelType:
+        """
+        Construye el modelo sin validar un documento de nuestra colección.
+        Los campos que falten toman su valor por defecto.
+        """
+        return self.model.model_construct(**doc)
 
-    async def create(self, obj_in: BaseModel) -> ModelType:
+    async def create(
+        self,
+        obj_in: Union[BaseModel, Dict[str, Any]],
+        refetch: bool = False,
+        session: Optional[AsyncClientSession] = None
+    ) -> ModelType:
         """
         Crea un nuevo documento en la colección.
         
-        Convierte el modelo Pydantic a diccionario, lo inserta en MongoDB,
-        luego recupera y valida el documento creado con el campo 'id' como string.
+        Convierte el modelo Pydantic a diccionario y lo inserta en MongoDB. El resultado se arma
+        con los datos insertados y el '_id' generado como 'id' (string), sin volver a leer el documento.
         
         Args:
-            obj_in: Instancia del modelo Pydantic con datos a insertar
+            obj_in: Instancia del modelo Pydantic, o documento ya validado (dict), con datos a insertar.
+                Un dict se inserta tal cual, sin pasar por el modelo.
+            refetch: Si es True, se vuelve a leer y validar el documento insertado (un viaje más a la BD).
+                Si es False, una instancia del modelo se copia con el nuevo 'id' (conserva sus submodelos)
+                y un dict se construye sin revalidar (model_construct)
+            session: Sesión opcional de MongoDB (ej. dentro de una transacción)
             
         Returns:
             ModelType: Instancia del modelo con datos del documento creado
@@ -50,18 +86,24 @@ class BaseRepository(Generic[ModelType]):
         Raises:
             RuntimeError: Si falla la inserción o no se encuentra el documento creado
         """
-        # Convertir el Pydantic model a diccionario, excluyendo campos no definidos
-        insert_data = obj_in.model_dump(exclude={"id"})
+        insert_data = self._to_document(obj_in)
         
         # Insertar el documento en MongoDB
-        result = await self.collection.insert_one(insert_data)
+        result = await self.collection.insert_one(insert_data, session=session)
         
         # Verificar que la inserción fue exitosa
         if not result.inserted_id:
             raise RuntimeError("Failed to insert document")
         
+        if not refetch:
+            if isinstance(obj_in, self.model):
+                return obj_in.model_copy(update={"id": str(result.inserted_id)})
+            # insert_one añade el '_id' generado a insert_data
+            insert_data["id"] = str(insert_data.pop("_id"))
+            return self.model.model_construct(**insert_data)
+        
         # Recuperar el documento recién insertado
-        created_doc = await self.collection.find_one({"_id": result.inserted_id})
+        created_doc = await self.collection.find_one({"_id": result.inserted_id}, session=session)
         
         # Verificar que se encontró el documento
         if not created_doc:
@@ -71,16 +113,55 @@ class BaseRepository(Generic[ModelType]):
         created_doc["id"] = str(created_doc.pop("_id"))
         return self.model.model_validate(created_doc)
 
-    async def get(self, item_id: str) -> Optional[ModelType]:
+    async def create_many(self, objs_in: List[Union[BaseModel, Dict[str, Any]]]) -> Tuple[List[ModelType], List[Dict[str, Any]]]:
+        """
+        Crea varios documentos con un solo insert_many no ordenado.
+        
+        Los documentos que fallan (ej. por índices únicos) no detienen el resto; sus errores
+        se retornan tal como los reporta MongoDB ('index', 'code', 'keyPattern', ...).
+        
+        Args:
+            objs_in: Lista de instancias del modelo Pydantic o documentos ya validados (dict)
+            
+        Returns:
+            Tuple[List[ModelType], List[Dict[str, Any]]]: Documentos creados y errores de escritura
+        """
+        if not objs_in:
+            return [], []
+        insert_data = [self._to_document(obj) for obj in objs_in]
+        
+        write_errors: List[Dict[str, Any]] = []
+        try:
+            await self.collection.insert_many(insert_data, ordered=False)
+        except pymongo.errors.BulkWriteError as err:
+            write_errors = err.details.get("writeErrors", [])
+        
+        failed = {error["index"] for error in write_errors}
+        created = []
+        for index, doc in enumerate(insert_data):
+            if index in failed:
+                continue
+            # insert_many añade el '_id' generado a cada documento
+            doc["id"] = str(doc.pop("_id"))
+            created.append(self.model.model_construct(**doc))
+        return created, write_errors
+
+    async def get(
+        self, 
+        item_id: Union[str, ObjectId], 
+        projection: Optional[Dict[str, Any]] = None
+    ) -> Optional[ModelType]:
         """
         Obtiene un documento por su ID.
         
         Realiza la conversión de:
-        - ID de entrada (string) → ObjectId para consulta MongoDB
+        - ID de entrada (string) → ObjectId para consulta MongoDB (se omite si ya es un ObjectId)
         - Documento resultante: '_id' (ObjectId) → 'id' (string)
         
         Args:
-            item_id: ID del documento como string
+            item_id: ID del documento como string u ObjectId
+            projection: Proyección de MongoDB opcional para limitar los campos devueltos.
+                Los campos excluidos deben ser opcionales en el modelo.
             
         Returns:
             ModelType | None: Instancia del modelo con los datos del documento,
@@ -88,17 +169,17 @@ class BaseRepository(Generic[ModelType]):
         """
         try:
             # Convertir string ID a ObjectId de MongoDB
-            obj_id = ObjectId(item_id)
+            obj_id = item_id if isinstance(item_id, ObjectId) else ObjectId(item_id)
             
             # Buscar el documento por su ID
-            doc = await self.collection.find_one({"_id": obj_id})
+            doc = await self.collection.find_one({"_id": obj_id}, projection or self._projection)
             
             if doc:
                 # Transformación centralizada
                 doc["id"] = str(doc.pop("_id"))
                 return self.model.model_validate(doc)
         except (pymongo.errors.PyMongoError, Exception) as e:
-            print(f"Error getting document: {e}")
+            logger.error("Error getting document: %s", e)
         return None
 
     async def get_multi(
@@ -106,7 +187,9 @@ class BaseRepository(Generic[ModelType]):
         skip: int = 0, 
         limit: int = 200, 
         sort_field: Optional[str] = None, 
-        sort_direction: int = 1
+        sort_direction: int = 1,
+        construct: bool = False,
+        projection: Optional[Dict[str, Any]] = None
     ) -> List[ModelType]:
         """
         Obtiene múltiples documentos con paginación y ordenamiento opcional.
@@ -119,12 +202,15 @@ class BaseRepository(Generic[ModelType]):
             limit: Número máximo de documentos a devolver
             sort_field: Campo para ordenar los resultados
             sort_direction: Dirección de ordenamiento (1 = ascendente, -1 = descendente)
+            construct: Si es True, los documentos se construyen sin validar (model_construct).
+                Por defecto se validan con el modelo (model_validate), ver find_many
+            projection: Proyección de MongoDB opcional para limitar los campos devueltos, ver find_many
             
         Returns:
             List[ModelType]: Lista de instancias del modelo con los documentos
         """
         # Crear cursor base para todos los documentos
-        cursor = self.collection.find({})
+        cursor = self.collection.find({}, projection or self._projection)
         
         # Aplicar ordenamiento si se especificó
         if sort_field:
@@ -134,10 +220,11 @@ class BaseRepository(Generic[ModelType]):
         cursor = cursor.skip(skip).limit(limit)
         
         # Procesar resultados con transformación centralizada
+        build = self._construct if construct else self.model.model_validate
         results = []
         async for doc in cursor:
             doc["id"] = str(doc.pop("_id"))
-            results.append(self.model.model_validate(doc))
+            results.append(build(doc))
         return results
 
     async def update(
@@ -171,9 +258,85 @@ class BaseRepository(Generic[ModelType]):
                 updated_doc["id"] = str(updated_doc.pop("_id"))
                 return self.model.model_validate(updated_doc)
         except pymongo.errors.PyMongoError as e:
-            print(f"Error updating document: {e}")
+            logger.error("Error updating document: %s", e)
         return None
 
+    async def find_one_and_update(
+        self, 
+        query: Dict[str, Any], 
+        update_data: Dict[str, Any],
+        session: Optional[AsyncClientSession] = None
+    ) -> Optional[ModelType]:
+        """
+        Aplica un $set al primer documento que cumple la consulta y lo retorna ya actualizado,
+        en una sola operación atómica.
+        
+        A diferencia de update(), no captura los errores de MongoDB (ej. DuplicateKeyError),
+        para que el servicio pueda traducirlos.
+        
+        Args:
+            query: Diccionario con criterios de búsqueda
+            update_data: Diccionario con campos a actualizar
+            session: Sesión opcional de MongoDB (ej. dentro de una transacción)
+            
+        Returns:
+            ModelType | None: Instancia del modelo con los datos actualizados,
+            o None si ningún documento cumple la consulta
+        """
+        updated_doc = await self.collection.find_one_and_update(
+            query,
+            {"$set": update_data},
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        if updated_doc:
+            updated_doc["id"] = str(updated_doc.pop("_id"))
+            return self.model.model_validate(updated_doc)
+        return None
+
+    async def update_one(
+        self,
+        query: Dict[str, Any],
+        update_data: Dict[str, Any],
+        session: Optional[AsyncClientSession] = None
+    ) -> bool:
+        """
+        Aplica un $set al primer documento que cumple la consulta, sin leerlo.
+        Permite actualizaciones condicionales y por ruta (ej. 'vehicle_slots.automovil').
+        
+        Args:
+            query: Diccionario con criterios de búsqueda
+            update_data: Diccionario con campos a actualizar
+            session: Sesión opcional de MongoDB (ej. dentro de una transacción)
+            
+        Returns:
+            bool: True si se modificó un documento
+        """
+        result = await self.collection.update_one(query, {"$set": update_data}, session=session)
+        return result.modified_count > 0
+
+    async def bulk_write(
+        self,
+        operations: List[Any],
+        ordered: bool = True,
+        session: Optional[AsyncClientSession] = None
+    ) -> int:
+        """
+        Ejecuta varias operaciones de escritura (UpdateOne, InsertOne, ...) en un solo viaje a la BD.
+        
+        Args:
+            operations: Lista de operaciones de pymongo
+            ordered: Si es True, se aplican en orden y se detiene en el primer error
+            session: Sesión opcional de MongoDB (ej. dentro de una transacción)
+            
+        Returns:
+            int: Número de documentos modificados
+        """
+        if not operations:
+            return 0
+        result = await self.collection.bulk_write(operations, ordered=ordered, session=session)
+        return result.modified_count
+
     async def delete(self, item_id: str) -> bool:
         """
         Elimina un documento por su ID.
@@ -192,9 +355,31 @@ class BaseRepository(Generic[ModelType]):
             result = await self.collection.delete_one({"_id": obj_id})
             return result.deleted_count > 0
         except Exception as e:
-            print(f"Error deleting document: {e}")
+            logger.error("Error deleting document: %s", e)
             return False
 
+    async def find_one_and_delete(
+        self,
+        query: Dict[str, Any],
+        session: Optional[AsyncClientSession] = None
+    ) -> Optional[ModelType]:
+        """
+        Elimina el primer documento que cumple la consulta y lo retorna, en una sola operación atómica.
+        
+        Args:
+            query: Diccionario con criterios de búsqueda
+            session: Sesión opcional de MongoDB (ej. dentro de una transacción)
+            
+        Returns:
+            ModelType | None: Instancia del modelo con los datos del documento eliminado,
+            o None si ningún documento cumple la consulta
+        """
+        deleted_doc = await self.collection.find_one_and_delete(query, session=session)
+        if deleted_doc:
+            deleted_doc["id"] = str(deleted_doc.pop("_id"))
+            return self.model.model_validate(deleted_doc)
+        return None
+
     async def find_one(self, query: Dict[str, Any]) -> Optional[ModelType]:
         """
         Encuentra un documento mediante una consulta específica.
@@ -209,17 +394,35 @@ class BaseRepository(Generic[ModelType]):
             ModelType | None: Instancia del modelo con el documento encontrado,
             o None si no se encuentra
         """
-        doc = await self.collection.find_one(query)
+        doc = await self.collection.find_one(query, self._projection)
         if doc:
             doc["id"] = str(doc.pop("_id"))
             return self.model.model_validate(doc)
         return None
 
+    async def find_one_id(self, query: Dict[str, Any]) -> Optional[str]:
+        """
+        Retorna solo el ID (string) del primer documento que cumple la consulta.
+        
+        Proyecta únicamente '_id', por lo que no transfiere ni valida el documento completo.
+        
+        Args:
+            query: Diccionario con criterios de búsqueda
+            
+        Returns:
+            str | None: ID del documento encontrado, o None si no existe
+        """
+        doc = await self.collection.find_one(query, {"_id": 1})
+        return str(doc["_id"]) if doc else None
+
     async def find_many(
         self, 
         query: Dict[str, Any], 
         skip: int = 0, 
-        limit: int = 100
+        limit: int = 100,
+        sort: Optional[List[Tuple[str, int]]] = None,
+        construct: bool = False,
+        projection: Optional[Dict[str, Any]] = None
     ) -> List[ModelType]:
         """
         Encuentra múltiples documentos mediante una consulta específica con paginación.
@@ -227,29 +430,238 @@ class BaseRepository(Generic[ModelType]):
         Aplica la transformación centralizada a cada documento recuperado:
         '_id' (ObjectId) → 'id' (string)
         
+        Por defecto cada documento se valida con el modelo (model_validate): los resultados pueden
+        ir directo a list_response/item_response, que no vuelven a validar, y un documento antiguo
+        o incompleto debe fallar aquí y no al serializar. construct=True los construye sin validar
+        (model_construct), solo para lecturas internas con proyecciones conocidas: no hay coerción
+        de tipos y los modelos anidados quedan como dict.
+        
         Args:
             query: Diccionario con criterios de búsqueda
             skip: Número de documentos a omitir (paginación)
             limit: Número máximo de documentos a devolver
+            sort: Lista opcional de pares (campo, dirección) para ordenar en MongoDB
+            construct: Si es True, los documentos se construyen sin validar (model_construct)
+            projection: Proyección de MongoDB opcional para limitar los campos devueltos.
+                Si excluye campos obligatorios requiere construct=True; los campos excluidos quedan
+                sin asignar en el modelo construido, así que solo deben leerse los proyectados
             
         Returns:
             List[ModelType]: Lista de instancias del modelo con los documentos encontrados
         """
-        cursor = self.collection.find(query).skip(skip).limit(limit)
+        cursor = self.collection.find(query, projection or self._projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        cursor = cursor.skip(skip).limit(limit)
+        build = self._construct if construct else self.model.model_validate
+        results = []
+        async for doc in cursor:
+            doc["id"] = str(doc.pop("_id"))
+            results.append(build(doc))
+        return results
+
+    async def find_many_raw(
+        self,
+        query: Dict[str, Any],
+        projection: Dict[str, Any],
+        skip: int = 0,
+        limit: int = 100,
+        sort: Optional[List[Tuple[str, int]]] = None,
+        session: Optional[AsyncClientSession] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Como find_many, pero con proyección y sin validar los documentos con el modelo:
+        para listados que solo devuelven algunos campos. El '_id' se convierte a 'id' (string).
+        
+        Args:
+            query: Diccionario con criterios de búsqueda
+            projection: Proyección de MongoDB con los campos a devolver
+            skip: Número de documentos a omitir (paginación)
+            limit: Número máximo de documentos a devolver
+            sort: Lista opcional de pares (campo, dirección) para ordenar en MongoDB
+            session: Sesión opcional de MongoDB (ej. dentro de una transacción)
+            
+        Returns:
+            List[Dict[str, Any]]: Documentos proyectados
+        """
+        cursor = self.collection.find(query, projection, session=session)
+        if sort:
+            cursor = cursor.sort(sort)
+        cursor = cursor.skip(skip).limit(limit)
+        results = []
+        async for doc in cursor:
+            if "_id" in doc:
+                doc["id"] = str(doc.pop("_id"))
+            results.append(doc)
+        return results
+
+    async def find_by_ids(
+        self,
+        ids: Iterable[Union[str, ObjectId]],
+        projection: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Obtiene en una sola consulta ($in) los documentos con los IDs indicados, sin validarlos
+        con el modelo. Los IDs inválidos se ignoran y el '_id' se convierte a 'id' (string).
+        
+        Args:
+            ids: IDs de los documentos como string u ObjectId (se admiten repetidos)
+            projection: Proyección de MongoDB opcional con los campos a devolver
+            
+        Returns:
+            List[Dict[str, Any]]: Documentos encontrados, sin orden garantizado
+        """
+        object_ids = {object_id for object_id in map(parse_object_id, ids) if object_id is not None}
+        if not object_ids:
+            return []
+        results = []
+        async for doc in self.collection.find({"_id": {"$in": list(object_ids)}}, projection):
+            doc["id"] = str(doc.pop("_id"))
+            results.append(doc)
+        return results
+
+    async def aggregate(self, pipeline: List[Dict[str, Any]], **kwargs: Any) -> List[ModelType]:
+        """
+        Ejecuta un pipeline de agregación y valida cada documento resultante con el modelo.
+        
+        Aplica la transformación centralizada a cada documento recuperado:
+        '_id' (ObjectId) → 'id' (string)
+        
+        Args:
+            pipeline: Lista de etapas de agregación de MongoDB
+            **kwargs: Opciones adicionales para aggregate (ej. collation)
+            
+        Returns:
+            List[ModelType]: Lista de instancias del modelo con los documentos resultantes
+        """
+        cursor = await self.collection.aggregate(pipeline, **kwargs)
         results = []
         async for doc in cursor:
             doc["id"] = str(doc.pop("_id"))
             results.append(self.model.model_validate(doc))
         return results
 
-    async def count(self, query: Dict[str, Any]) -> int:
+    async def aggregate_raw(self, pipeline: List[Dict[str, Any]], **kwargs: Any) -> List[Dict[str, Any]]:
+        """
+        Ejecuta un pipeline de agregación y retorna los documentos tal cual, sin validarlos con el modelo.
+        Útil cuando el pipeline proyecta una forma distinta a la del modelo de la colección.
+        
+        Args:
+            pipeline: Lista de etapas de agregación de MongoDB
+            **kwargs: Opciones adicionales para aggregate (ej. collation)
+            
+        Returns:
+            List[Dict[str, Any]]: Documentos resultantes
+        """
+        cursor = await self.collection.aggregate(pipeline, **kwargs)
+        return [doc async for doc in cursor]
+
+    async def iter_aggregate(self, pipeline: List[Dict[str, Any]], **kwargs: Any) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Ejecuta un pipeline de agregación y entrega los documentos uno a uno, sin validarlos
+        ni acumularlos en memoria (para respuestas en streaming).
+        
+        Args:
+            pipeline: Lista de etapas de agregación de MongoDB
+            **kwargs: Opciones adicionales para aggregate (ej. batchSize)
+            
+        Yields:
+            Dict[str, Any]: Documentos resultantes
+        """
+        cursor = await self.collection.aggregate(pipeline, **kwargs)
+        async for doc in cursor:
+            yield doc
+
+    async def aggregate_paged(
+        self,
+        match_stages: List[Dict[str, Any]],
+        page_stages: List[Dict[str, Any]],
+        skip: int = 0,
+        limit: int = 100,
+        item_stages: Optional[List[Dict[str, Any]]] = None,
+        **kwargs: Any
+    ) -> Tuple[List[ModelType], int]:
+        """
+        Obtiene una página de documentos y el total de coincidencias en un solo viaje a la BD.
+        
+        Usa $facet: la rama 'items' aplica page_stages (ej. $addFields + $sort), $skip y $limit,
+        y la rama 'total' cuenta los documentos que pasaron match_stages.
+        
+        Args:
+            match_stages: Etapas de filtrado comunes a ambas ramas (ej. [{"$match": query}])
+            page_stages: Etapas de ordenamiento/proyección aplicadas solo a los elementos
+            skip: Número de documentos a omitir (paginación)
+            limit: Número máximo de documentos a devolver
+            item_stages: Etapas aplicadas a los elementos después de paginar (ej. $lookup),
+                para que solo procesen los documentos de la página
+            **kwargs: Opciones adicionales para aggregate (ej. collation)
+            
+        Returns:
+            Tuple[List[ModelType], int]: Documentos de la página y total de coincidencias
+        """
+        pipeline = match_stages + [
+            {"$facet": {
+                "items": page_stages + [{"$skip": skip}, {"$limit": limit}] + (item_stages or []),
+                "total": [{"$count": "n"}],
+            }}
+        ]
+        cursor = await self.collection.aggregate(pipeline, **kwargs)
+        results: List[ModelType] = []
+        total = 0
+        async for facet in cursor:
+            for doc in facet["items"]:
+                doc["id"] = str(doc.pop("_id"))
+                results.append(self.model.model_validate(doc))
+            if facet["total"]:
+                total = facet["total"][0]["n"]
+        return results, total
+
+    async def count(self, query: Dict[str, Any], limit: Optional[int] = None) -> int:
         """
         Cuenta el número de documentos que cumplen con una consulta específica.
         
         Args:
             query: Diccionario con criterios de búsqueda
+            limit: Máximo de documentos a contar; útil cuando solo importa si hay "al menos N"
             
         Returns:
-            int: Número de documentos que cumplen con la consulta
+            int: Número de documentos que cumplen con la consulta (como máximo 'limit')
         """
-        return await self.collection.count_documents(query)
\ No newline at end of file
+        if limit:
+            return await self.collection.count_documents(query, limit=limit)
+        return await self.collection.count_documents(query)
+
+def parse_object_id(value: Any) -> Optional[ObjectId]:
+    """
+    Convierte un ID en ObjectId con un solo análisis del texto, o retorna None si no es válido.
+    Evita el doble trabajo de ObjectId.is_valid() seguido de ObjectId().
+    """
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        return None
+
+
+# Caché de repositorios por (base de datos, colección, modelo). La base de datos es un
+# singleton por proceso, así que cada repositorio se construye una sola vez.
+_repositories: Dict[Tuple[int, str, type], Tuple[Any, BaseRepository]] = {}
+
+def get_repository(db: Any, collection_name: str, model: Type[ModelType]) -> BaseRepository[ModelType]:
+    """
+    Retorna el repositorio compartido para la colección y el modelo indicados.
+
+    Args:
+        db: Instancia de la base de datos MongoDB
+        collection_name: Nombre de la colección
+        model: Clase del modelo Pydantic para validación de documentos
+
+    Returns:
+        BaseRepository: Repositorio reutilizable entre peticiones
+    """
+    key = (id(db), collection_name, model)
+    cached = _repositories.get(key)
+    if cached is None or cached[0] is not db:
+        # Se guarda la referencia a db para que su id no pueda reutilizarse mientras exista la entrada
+        cached = (db, BaseRepository(db[collection_name], model))
+        _repositories[key] = cached
+    return cached[1]
@@ -0,0 +1,41 @@
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, Type
+
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+
+@lru_cache(maxsize=None)
+def _schema_fields(schema: Type[BaseModel]) -> FrozenSet[str]:
+    """
+    Campos públicos de un esquema de salida (calculados una sola vez por esquema).
+    """
+    return frozenset(schema.model_fields)
+
+
+def dump_as(item: BaseModel, schema: Type[BaseModel]) -> Dict[str, Any]:
+    """
+    Convierte un modelo leído de MongoDB al diccionario de un esquema de salida sin revalidarlo:
+    los datos ya fueron validados por el modelo, así que solo se seleccionan los campos del esquema.
+    """
+    return item.model_dump(include=_schema_fields(schema))
+
+
+def list_response(items: Iterable[BaseModel], schema: Type[BaseModel], **extra: Any) -> ORJSONResponse:
+    """
+    Respuesta JSON para listados: serializa los modelos con orjson sin pasar por la
+    validación de response_model en cada fila. Si se indican campos extra (ej. total),
+    la lista se envuelve en un objeto con la clave 'items'.
+    """
+    content = [dump_as(item, schema) for item in items]
+    if extra:
+        return ORJSONResponse({"items": content, **extra})
+    return ORJSONResponse(content)
+
+
+def item_response(item: BaseModel, schema: Type[BaseModel], status_code: int = 200) -> ORJSONResponse:
+    """
+    Respuesta JSON para un único modelo (ej. un sorteo con miles de participantes anidados):
+    se serializa con orjson sin revalidarlo contra response_model.
+    """
+    return ORJSONResponse(dump_as(item, schema), status_code=status_code)
@@ -1,4 +1,5 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from app.database.mongodb import connect_to_mongo, close_mongo_connection, get_database
 from contextlib import asynccontextmanager
 from app.core.security import get_password_hash, verify_password  # Importa las funciones actualizadas
@@ -40,7 +41,7 @@ async def lifespan(app: FastAPI):
     yield
     await close_mongo_connection()
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Incluye todos los routers necesarios
 app.include_router(auth_router)
@@ -1,5 +1,7 @@
 # app/test/main-repository.py
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from app.core.config import settings
 from app.database.mongodb import connect_to_mongo, close_mongo_connection, get_database
 from app.modules.residentes.models import User
 from app.shared.repository import BaseRepository 
@@ -8,12 +10,11 @@ from bson import ObjectId
 import asyncio
 from typing import cast
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    await connect_to_mongo()
-    db = get_database()
-    user_repo = BaseRepository(db["users"], User)
-    
+async def run_repository_tests(user_repo: BaseRepository[User]) -> None:
+    """
+    Ejercita las operaciones del repositorio (crear, leer, actualizar, buscar y eliminar)
+    sobre un usuario de prueba e imprime los resultados.
+    """
     print("\n" + "="*50)
     print("INICIO DE PRUEBAS DEL REPOSITORIO")
     print("="*50)
@@ -44,34 +45,37 @@ async def lifespan(app: FastAPI):
     print(f"Nombre: {created_user.full_name}")
     print(f"Email: {created_user.email}")
     
-    # 2. Prueba de obtención por ID
-    fetched_user = await user_repo.get(user_id)
+    # 2-5. Lecturas independientes entre sí: se lanzan juntas.
+    # De los listados solo se usan los totales y el nombre del primero: se cuentan en MongoDB
+    # y se trae un único documento proyectado
+    fetched_user, query_user, first_users, total_count, active_count = await asyncio.gather(
+        user_repo.get(user_id),
+        user_repo.find_one({"email": "admin_test@condominio.com"}),
+        user_repo.get_multi(limit=1, sort_field="_id", projection={"full_name": 1}, construct=True),
+        user_repo.count({}),
+        user_repo.count({"status": "active"}),
+    )
+
     print("\n✅ Usuario obtenido por ID:")
     print(f"ID coincide: {user_id == fetched_user.id}") # type: ignore
     print(f"Nombre coincide: {created_user.full_name == fetched_user.full_name}") # type: ignore
     
-    # 3. Prueba de actualización
-    update_data = {"phone_number": "+573002222222", "apartment": "Torre Test, Apto 202"}
-    updated_user = await user_repo.update(user_id, update_data)
-    print("\n✅ Usuario actualizado:")
-    print(f"Teléfono actualizado: {updated_user.phone_number}") # type: ignore
-    print(f"Apartamento actualizado: {updated_user.apartment}") # type: ignore
-    
-    # 4. Prueba de búsqueda por query
-    query_user = await user_repo.find_one({"email": "admin_test@condominio.com"})
     print("\n✅ Usuario encontrado por query:")
     print(f"ID encontrado: {query_user.id if query_user else 'No encontrado'}")
     
-    # 5. Prueba de obtención múltiple
-    all_users = await user_repo.get_multi()
     print("\n✅ Usuarios obtenidos (get_multi):")
-    print(f"Total usuarios: {len(all_users)}")
-    print(f"Primer usuario: {all_users[0].full_name if all_users else 'Ninguno'}")
+    print(f"Total usuarios: {total_count}")
+    print(f"Primer usuario: {first_users[0].full_name if first_users else 'Ninguno'}")
     
-    # 6. Prueba de búsqueda múltiple
-    active_users = await user_repo.find_many({"status": "active"})
     print("\n✅ Usuarios activos encontrados:")
-    print(f"Total activos: {len(active_users)}")
+    print(f"Total activos: {active_count}")
+    
+    # 6. Prueba de actualización
+    update_data = {"phone_number": "+573002222222", "apartment": "Torre Test, Apto 202"}
+    updated_user = await user_repo.update(user_id, update_data)
+    print("\n✅ Usuario actualizado:")
+    print(f"Teléfono actualizado: {updated_user.phone_number}") # type: ignore
+    print(f"Apartamento actualizado: {updated_user.apartment}") # type: ignore
     
     # 7. Prueba de eliminación
     delete_result = await user_repo.delete(user_id)
@@ -85,12 +89,22 @@ async def lifespan(app: FastAPI):
     print("\n" + "="*50)
     print("FIN DE PRUEBAS DEL REPOSITORIO")
     print("="*50)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await connect_to_mongo()
+    
+    # Las pruebas solo se ejecutan si se piden explícitamente (RUN_REPO_TESTS=1):
+    # así el arranque no espera a sus operaciones sobre MongoDB
+    if settings.RUN_REPO_TESTS:
+        db = get_database()
+        await run_repository_tests(BaseRepository(db["users"], User))
     
     yield
     
     await close_mongo_connection()
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 @app.get("/")
 async def root():
@@ -1,11 +1,14 @@
 from contextlib import asynccontextmanager
+import asyncio
+import anyio.to_thread
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-import os
 
 import resend
 from resend import Emails
 
+from app.core.config import get_settings
 from app.database.mongodb import connect_to_mongo, close_mongo_connection
 from app.modules.auth.router import router as auth_router
 from app.modules.residentes.router import router as resident_router
@@ -13,42 +16,50 @@ from app.modules.solicitudes.router import router as requests_router
 from app.modules.sorteo.router import router as lottery_router
 
 # Configurar la clave API de Resend
-RESEND_KEY = os.getenv('RESEND_KEY')
+RESEND_KEY = get_settings().RESEND_KEY
 if not RESEND_KEY:
     raise RuntimeError("La variable de entorno RESEND_KEY no está configurada.")
 resend.api_key = RESEND_KEY
 
+# Correo de prueba: contenido fijo definido una sola vez a nivel de módulo
+TEST_EMAIL = "nhenaoz@unicartagena.edu.co"  # reemplaza por un correo válido
+TEST_EMAIL_HTML = """
+<html>
+  <body>
+    <h1>¡Hola, Mundo!</h1>
+    <p>Esta es una prueba de envío con Resend desde Park‑Net API.</p>
+    <p>Fecha y hora: Domingo, 15 de Junio de 2025 11:31 (UTC-5)</p>
+  </body>
+</html>
+"""
+TEST_EMAIL_PARAMS = {
+    "from": "Park‑Net Notificaciones <onboarding@resend.dev>",
+    "subject": "Prueba de Correo – Hello World",
+    "html": TEST_EMAIL_HTML,
+}
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Conexión a MongoDB
-    await connect_to_mongo()
-    print("✅ Conexión a MongoDB establecida exitosamente.")
+    # Hilos disponibles para llamadas síncronas (SDK de Resend, endpoints def); el valor por defecto es 40
+    anyio.to_thread.current_default_thread_limiter().total_tokens = 100
+
+    params: Emails.SendParams = {**TEST_EMAIL_PARAMS, "to": [TEST_EMAIL]}
 
-    # Prueba de envío de correo
-    test_email = "nhenaoz@unicartagena.edu.co"  # reemplaza por un correo válido
-    html_content = """
-    <html>
-      <body>
-        <h1>¡Hola, Mundo!</h1>
-        <p>Esta es una prueba de envío con Resend desde Park‑Net API.</p>
-        <p>Fecha y hora: Domingo, 15 de Junio de 2025 11:31 (UTC-5)</p>
-      </body>
-    </html>
-    """
+    async def send_test_email() -> None:
+        try:
+            # Emails.send es síncrono y devuelve un dict: se ejecuta en un hilo para no bloquear el event loop
+            result = await anyio.to_thread.run_sync(Emails.send, params)
+            print(f"✅ Prueba de correo enviada con éxito a {TEST_EMAIL}; response id = {result.get('id')}")
+        except Exception as e:
+            print(f"❌ Error en prueba de correo a {TEST_EMAIL}: {e}")
 
-    params: Emails.SendParams = {
-        "from": "Park‑Net Notificaciones <onboarding@resend.dev>",
-        "to": [test_email],
-        "subject": "Prueba de Correo – Hello World",
-        "html": html_content
-    }
+    async def connect() -> None:
+        await connect_to_mongo()
+        print("✅ Conexión a MongoDB establecida exitosamente.")
 
-    try:
-        # Emails.send es síncrono y devuelve un dict
-        result = Emails.send(params)
-        print(f"✅ Prueba de correo enviada con éxito a {test_email}; response id = {result.get('id')}")
-    except Exception as e:
-        print(f"❌ Error en prueba de correo a {test_email}: {e}")
+    # La conexión a MongoDB y el correo de prueba son independientes: se ejecutan a la vez.
+    # El correo maneja sus propios errores; un fallo de conexión sí detiene el arranque
+    await asyncio.gather(connect(), send_test_email())
 
     yield
 
@@ -61,7 +72,8 @@ app = FastAPI(
     version="1.0.0",
     lifespan=lifespan,
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse  # Serialización JSON con orjson
 )
 
 # Configurar CORS
@@ -1,11 +1,16 @@
 from typing import Annotated
 from fastapi import FastAPI, HTTPException, Depends
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 from datetime import datetime
 
-from motor.motor_asyncio import AsyncIOMotorDatabase
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
 
-from app.core.dependencies import get_current_active_admin_user
+from pymongo.asynchronous.database import AsyncDatabase
+
+from app.core.dependencies import require_admin
+from app.core.config import settings
 from app.database.mongodb import connect_to_mongo, close_mongo_connection, get_database
 from app.core.security import get_password_hash, verify_password
 from app.modules.auth.router import router as auth_router
@@ -29,19 +34,32 @@ async def lifespan(app: FastAPI):
     
     db = get_database()
     
-    # --- Lógica para asegurar que exista un usuario administrador por defecto ---
-    admin = await db.users.find_one({"cc": "0000000000", "role": "administrador"}) 
+    # --- Usuarios de prueba: administrador por defecto y residente ---
+    # Una sola consulta para ambos (índice único de cc), proyectando solo lo que se lee;
+    # los usuarios que falten se insertan con un solo insert_many
+    existing_users = {
+        user["cc"]: user
+        async for user in db.users.find({"cc": {"$in": ["0000000000", "1234567890"]}}, {"_id": 1, "cc": 1, "role": 1})
+    }
+    admin = existing_users.get("0000000000")
+    if admin and admin.get("role") != "administrador":
+        admin = None
+    resident = existing_users.get("1234567890")
+    pending_users = []
+
     if not admin:
         print("\n⏳ Creando usuario administrador por defecto...")
         
         # PRUEBA DE HASHING - ANTES DE CREAR EL ADMIN
         test_password = "admin_password"
         test_hash = get_password_hash(test_password)
-        print(f"\n🔒 PRUEBA DE SEGURIDAD INTERNA (main.py):")
-        print(f"Contraseña original: {test_password}")
-        print(f"Hash generado: {test_hash}")
-        print(f"Verificación exitosa: {verify_password(test_password, test_hash)}")
-        print(f"Verificación fallida (pass incorrecta): {verify_password('wrong_password', test_hash)}\n")
+        # Diagnóstico opcional (DEBUG_SECURITY=1): cada verificación repite el cálculo del hash
+        if settings.DEBUG_SECURITY:
+            print(f"\n🔒 PRUEBA DE SEGURIDAD INTERNA (main.py):")
+            print(f"Contraseña original: {test_password}")
+            print(f"Hash generado: {test_hash}")
+            print(f"Verificación exitosa: {verify_password(test_password, test_hash)}")
+            print(f"Verificación fallida (pass incorrecta): {verify_password('wrong_password', test_hash)}\n")
         
         # Creamos la instancia del modelo User para el administrador
         admin_user_data = User(
@@ -54,22 +72,15 @@ async def lifespan(app: FastAPI):
             role="administrador",
             status="active"
         ) # type: ignore
-
-        try:
-            # Insertamos el documento directamente en la colección 'users'
-            result = await db.users.insert_one(admin_user_data.model_dump(by_alias=True, exclude_unset=True))
-            admin_id = str(result.inserted_id)
-            print(f"✅ Usuario administrador creado con ID: {admin_id}")
-            print(f"   Credenciales iniciales: CC='0000000000', Contraseña='{test_password}'")
-        except Exception as e:
-            print(f"❌ Error al crear el usuario administrador: {e}")
-            admin_id = None
+        # El _id se genera aquí para conocerlo antes de insertar
+        admin_object_id = ObjectId()
+        pending_users.append({"_id": admin_object_id, **admin_user_data.model_dump(by_alias=True, exclude_unset=True)})
+        admin_id = str(admin_object_id)
+        print(f"   Credenciales iniciales: CC='0000000000', Contraseña='{test_password}'")
     else:
         admin_id = str(admin["_id"])
         print("ℹ️ Usuario administrador ya existe. Saltando creación.")
     
-    # --- Crear usuario residente de prueba ---
-    resident = await db.users.find_one({"cc": "1234567890"})
     if not resident:
         print("\n⏳ Creando usuario residente de prueba...")
         resident_password = "resident_password"
@@ -84,65 +95,85 @@ async def lifespan(app: FastAPI):
             role="residente",
             status="active"
         ) # type: ignore
-        
-        try:
-            result = await db.users.insert_one(resident_user_data.model_dump(by_alias=True, exclude_unset=True))
-            resident_id = str(result.inserted_id)
-            print(f"✅ Usuario residente creado con ID: {resident_id}")
-            print(f"   Credenciales: CC='1234567890', Contraseña='{resident_password}'")
-        except Exception as e:
-            print(f"❌ Error al crear el usuario residente: {e}")
-            resident_id = None
+        resident_object_id = ObjectId()
+        pending_users.append({"_id": resident_object_id, **resident_user_data.model_dump(by_alias=True, exclude_unset=True)})
+        resident_id = str(resident_object_id)
+        print(f"   Credenciales: CC='1234567890', Contraseña='{resident_password}'")
     else:
         resident_id = str(resident["_id"])
         print("ℹ️ Usuario residente de prueba ya existe. Saltando creación.")
     
-    # --- Crear solicitudes de prueba ---
+    # --- Solicitudes de prueba ---
+    # Se insertan después de los usuarios: si el residente no se pudo crear, no quedan
+    # solicitudes apuntando a un usuario inexistente.
+    # El período se calcula una sola vez: las solicitudes y el sorteo usan el mismo período aunque cambie el mes
+    current_period = datetime.now().strftime("%Y-%m")
+    
+    # Solicitud pendiente
+    request_pending = Request(
+        user_id=resident_id,
+        resident_cc="1234567890",
+        resident_full_name="Residente de Prueba",
+        vehicle_type="automovil",
+        license_plate="ABC123",
+        description="Solicitud pendiente de revisión",
+        disability=False,
+        pay=True,
+        lottery_period=current_period,
+        status="pending"
+    ) # type: ignore
+    
+    # Solicitud aceptada
+    request_accepted = Request(
+        user_id=resident_id,
+        resident_cc="1234567890",
+        resident_full_name="Residente de Prueba",
+        vehicle_type="motocicleta",
+        license_plate="XYZ789",
+        description="Solicitud aceptada",
+        disability=True,
+        pay=True,
+        lottery_period=current_period,
+        status="accepted"
+    ) # type: ignore
+
+    if pending_users:
+        try:
+            users_outcome = await db.users.insert_many(pending_users, ordered=False)
+            print(f"✅ {len(users_outcome.inserted_ids)} usuario(s) de prueba creado(s)")
+        except Exception as e:
+            print(f"❌ Error al crear los usuarios de prueba: {e}")
+            # Con ordered=False solo fallan los documentos listados en writeErrors
+            failed_ids = (
+                {pending_users[error["index"]]["_id"] for error in e.details.get("writeErrors", [])}
+                if isinstance(e, BulkWriteError)
+                else {user["_id"] for user in pending_users}
+            )
+            if not admin and ObjectId(admin_id) in failed_ids:
+                admin_id = None
+            if not resident and ObjectId(resident_id) in failed_ids:
+                resident_id = None
+
     if resident_id:
         print("\n⏳ Creando solicitudes de prueba para el residente...")
-        current_period = datetime.now().strftime("%Y-%m")
-        
-        # Solicitud pendiente
-        request_pending = Request(
-            user_id=resident_id,
-            resident_cc="1234567890",
-            resident_full_name="Residente de Prueba",
-            vehicle_type="automovil",
-            license_plate="ABC123",
-            description="Solicitud pendiente de revisión",
-            disability=False,
-            pay=True,
-            lottery_period=current_period,
-            status="pending"
-        ) # type: ignore
-        
-        # Solicitud aceptada
-        request_accepted = Request(
-            user_id=resident_id,
-            resident_cc="1234567890",
-            resident_full_name="Residente de Prueba",
-            vehicle_type="motocicleta",
-            license_plate="XYZ789",
-            description="Solicitud aceptada",
-            disability=True,
-            pay=True,
-            lottery_period=current_period,
-            status="accepted"
-        ) # type: ignore
-        
         try:
-            # Insertar solicitudes
-            await db.requests.insert_one(request_pending.model_dump(by_alias=True, exclude_unset=True))
-            await db.requests.insert_one(request_accepted.model_dump(by_alias=True, exclude_unset=True))
+            await db.requests.insert_many(
+                [
+                    request_pending.model_dump(by_alias=True, exclude_unset=True),
+                    request_accepted.model_dump(by_alias=True, exclude_unset=True),
+                ],
+                ordered=False # Un duplicado no impide insertar la otra solicitud
+            )
             print("✅ 2 solicitudes de prueba creadas (1 pendiente, 1 aceptada)")
         except Exception as e:
             print(f"❌ Error al crear solicitudes de prueba: {e}")
+    else:
+        print("⚠️ No hay usuario residente de prueba. Saltando creación de solicitudes.")
     
     # --- Ejecutar sorteo de prueba al iniciar ---
     if admin_id and resident_id:
         print("\n⏳ Ejecutando sorteo de prueba al iniciar la aplicación...")
         lottery_service = LotteryService(db)
-        current_period = datetime.now().strftime("%Y-%m")
         lottery_data = LotteryCreate(
             period=current_period,
             num_car_spots=1,
@@ -169,7 +200,8 @@ app = FastAPI(
     title="Park-Net API",
     description="API para la gestión de estacionamientos en condominios.",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse  # Serialización JSON con orjson
 )
 
 # --- Incluye todos los routers de tu aplicación ---
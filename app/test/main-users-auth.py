@@ -1,6 +1,8 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 
+from app.core.config import settings
 from app.database.mongodb import connect_to_mongo, close_mongo_connection, get_database
 from app.core.security import get_password_hash, verify_password
 from app.modules.auth.router import router as auth_router
@@ -28,11 +30,13 @@ async def lifespan(app: FastAPI):
         # PRUEBA DE HASHING - ANTES DE CREAR EL ADMIN (¡Esto es bueno para depuración!)
         test_password = "admin_password" # Contraseña por defecto para el admin
         test_hash = get_password_hash(test_password)
-        print(f"\n🔒 PRUEBA DE SEGURIDAD INTERNA (main.py):")
-        print(f"Contraseña original: {test_password}")
-        print(f"Hash generado: {test_hash}")
-        print(f"Verificación exitosa: {verify_password(test_password, test_hash)}")
-        print(f"Verificación fallida (pass incorrecta): {verify_password('wrong_password', test_hash)}\n")
+        # Diagnóstico opcional (DEBUG_SECURITY=1): cada verificación repite el cálculo del hash
+        if settings.DEBUG_SECURITY:
+            print(f"\n🔒 PRUEBA DE SEGURIDAD INTERNA (main.py):")
+            print(f"Contraseña original: {test_password}")
+            print(f"Hash generado: {test_hash}")
+            print(f"Verificación exitosa: {verify_password(test_password, test_hash)}")
+            print(f"Verificación fallida (pass incorrecta): {verify_password('wrong_password', test_hash)}\n")
         
         # Creamos la instancia del modelo User para el administrador
         admin_user_data = User(
@@ -47,10 +51,18 @@ async def lifespan(app: FastAPI):
         ) # type: ignore
 
         try:
-            # Insertamos el documento directamente en la colección 'users'
-            result = await db.users.insert_one(admin_user_data.model_dump(by_alias=True, exclude_unset=True))
-            print(f"✅ Usuario administrador creado con ID: {result.inserted_id}")
-            print(f"   Credenciales iniciales: CC='0000000000', Contraseña='{test_password}'")
+            # Upsert con $setOnInsert en lugar de insert_one: si otro worker lo creó entre la consulta
+            # y este punto, no se modifica ni falla por la cc duplicada
+            result = await db.users.update_one(
+                {"cc": "0000000000"},
+                {"$setOnInsert": admin_user_data.model_dump(by_alias=True, exclude_unset=True)},
+                upsert=True
+            )
+            if result.upserted_id is not None:
+                print(f"✅ Usuario administrador creado con ID: {result.upserted_id}")
+                print(f"   Credenciales iniciales: CC='0000000000', Contraseña='{test_password}'")
+            else:
+                print("ℹ️ Ya existe un usuario con la CC del administrador. Saltando creación.")
         except Exception as e:
             print(f"❌ Error al crear el usuario administrador: {e}")
     else:
@@ -67,7 +79,8 @@ app = FastAPI(
     title="Park-Net API",
     description="API para la gestión de estacionamientos en condominios.",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse  # Serialización JSON con orjson
 )
 
 # --- Incluye todos los routers de tu aplicación ---
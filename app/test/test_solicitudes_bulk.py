@@ -0,0 +1,57 @@
+"""
+Prueba de RequestService.bulk_update_status con IDs en mayúsculas/minúsculas mezcladas.
+Se ejecuta sin MongoDB: python -m unittest app.test.test_solicitudes_bulk
+"""
+import unittest
+from typing import Any, Dict, List
+
+from bson import ObjectId
+
+from app.modules.solicitudes.models import Request
+from app.modules.solicitudes.service import RequestService
+
+
+class FakeRequestRepository:
+    """
+    Repositorio en memoria con lo que usa bulk_update_status: find_many con $in y bulk_write.
+    """
+    def __init__(self, requests: List[Request]):
+        self.requests = {ObjectId(request.id): request for request in requests}
+        self.operations: List[Any] = []
+
+    async def find_many(self, query: Dict[str, Any], **kwargs: Any) -> List[Request]:
+        return [self.requests[object_id] for object_id in query["_id"]["$in"] if object_id in self.requests]
+
+    async def bulk_write(self, operations: List[Any], ordered: bool = True) -> None:
+        self.operations.extend(operations)
+
+
+class BulkUpdateStatusTest(unittest.IsolatedAsyncioTestCase):
+    async def test_mixed_case_ids_are_found(self):
+        request_id = str(ObjectId())
+        request = Request(
+            _id=request_id,
+            user_id=str(ObjectId()),
+            resident_cc="1234567890",
+            resident_full_name="Residente de Prueba",
+            vehicle_type="automovil",
+            license_plate="ABC123",
+            lottery_period="2025-07",
+            status="pending",
+        )
+        service = RequestService.__new__(RequestService)
+        service.request_repository = FakeRequestRepository([request])
+        service.user_repository = FakeRequestRepository([])
+
+        missing_id = str(ObjectId())
+        mixed_case_id = request_id[:12].upper() + request_id[12:]
+        results, not_found = await service.bulk_update_status([mixed_case_id, missing_id, "no-es-un-id"], "rejected")
+
+        self.assertEqual([result.id for result in results], [request_id])
+        self.assertEqual(results[0].status, "rejected")
+        self.assertEqual(not_found, [missing_id, "no-es-un-id"])
+        self.assertEqual(len(service.request_repository.operations), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()